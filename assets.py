@@ -0,0 +1,308 @@
+"""Изображения игры: пакет ресурсов и менеджер загрузки.
+
+Сборка (python assets.py) сохраняет масштабированные изображения как сырые
+пиксели (RGBA или RGB) с цветовым ключом и описание в JSON. При запуске файл
+отображается в память, а поверхности создаются прямо над его байтами -
+без декодирования PNG и transform.scale.
+
+Менеджер загружает изображение при первом обращении, переводит его в формат
+экрана и хранит: небольшие - все время работы, крупные фоны - в LRU-кэше
+с ограничением по памяти."""
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from os import path
+
+import pygame
+
+from my_tools import load_image, img_dir
+
+PACK_FILE = path.join(img_dir, 'assets.pack')
+MAGIC = b'PGPK'
+VERSION = 1
+HEADER = struct.Struct('<4sII')  # сигнатура, версия, длина описания
+ALIGN = 16  # выравнивание пиксельных данных
+
+# изображения больше LARGE_IMAGE байт попадают в LRU-кэш объемом не более BUDGET байт
+LARGE_IMAGE = 1024 * 1024
+BUDGET = 32 * 1024 * 1024
+
+
+def asset_key(name, size_=None, color_key=None):
+    if isinstance(size_, (tuple, list)):
+        size_ = tuple(int(value) for value in size_)
+    if isinstance(color_key, (tuple, list)):
+        color_key = tuple(color_key)
+    return name, size_, color_key
+
+
+def scale_image(image, size_):
+    '''Масштаб до размера (w, h) или в size_ раз'''
+    if size_ is None:
+        return image
+    if not isinstance(size_, tuple):
+        size_ = (int(image.get_width() * size_), int(image.get_height() * size_))
+    return pygame.transform.scale(image, size_)
+
+
+def source_stamp(name):
+    '''Отметка исходного файла: пакет не используется для измененных изображений'''
+    stat = os.stat(path.join(img_dir, name))
+    return [stat.st_size, int(stat.st_mtime)]
+
+
+def surface_bytes(image):
+    return image.get_width() * image.get_height() * image.get_bytesize()
+
+
+def image_pixels(image):
+    '''Пиксели изображения и их формат для pygame.image.frombuffer'''
+    pixel_format = 'RGBA' if image.get_flags() & pygame.SRCALPHA else 'RGB'
+    # при заданном цветовом ключе tobytes подменяет альфа-канал, поэтому ключ снимается на время
+    colorkey = image.get_colorkey()
+    image.set_colorkey(None)
+    pixels = pygame.image.tobytes(image, pixel_format)
+    if colorkey is not None:
+        image.set_colorkey(colorkey, pygame.RLEACCEL)
+    return pixels, pixel_format, colorkey
+
+
+def display_format(image):
+    '''Копия изображения в формате экрана (ускоряет вывод); без экрана - само изображение'''
+    if pygame.display.get_surface() is None:
+        return image
+    colorkey = image.get_colorkey()
+    if image.get_flags() & pygame.SRCALPHA:
+        # convert_alpha с цветовым ключом обнуляет почти прозрачные пиксели: ключ снимается на время
+        image.set_colorkey(None)
+        converted = image.convert_alpha()
+        if colorkey is not None:
+            image.set_colorkey(colorkey, pygame.RLEACCEL)
+    else:
+        converted = image.convert()
+    if colorkey is not None:
+        converted.set_colorkey(colorkey, pygame.RLEACCEL)
+    return converted
+
+
+class AssetManager:
+    """Загрузка изображений по требованию с кэшем и статистикой"""
+
+    def __init__(self, pack_path=PACK_FILE, budget=BUDGET, large_image=LARGE_IMAGE):
+        self.pack_path = pack_path
+        self.budget = budget
+        self.large_image = large_image
+        self.pack = None  # (файл, размер, ключ) -> описание изображения в пакете
+        self.view = None  # байты отображенного в память пакета
+        self.images = dict()  # небольшие изображения
+        self.backgrounds = OrderedDict()  # крупные изображения, от давно использованных к недавним
+        self.backgrounds_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        # все запрошенные изображения в порядке запроса (по ним собирается пакет)
+        self.manifest = dict()
+        self.building = False
+        # изображения запрашивают и игровой поток, и поток фоновой загрузки
+        self.lock = threading.RLock()
+
+    def get(self, name, size_=None, color_key=None, keep=True):
+        '''Изображение в окончательном размере и формате экрана.
+
+        size_ - размер (w, h) или коэффициент масштаба; при keep=False изображение
+        не сохраняется в кэше (исходные слои, нужные один раз для сборки фона)'''
+        key = asset_key(name, size_, color_key)
+        with self.lock:
+            self.manifest[key] = True
+            if self.pack is None:
+                self.open_pack()
+        return self.cached(key, lambda: display_format(self.load(key)), keep)
+
+    def cached(self, key, build, keep=True):
+        '''Изображение из кэша; при промахе оно создается функцией build() и сохраняется.
+
+        Так же хранятся и поверхности, собранные из нескольких изображений: вытесненная
+        из LRU-кэша освобождается и при следующем запросе собирается заново'''
+        with self.lock:
+            if key in self.images:
+                self.hits += 1
+                return self.images[key]
+            if key in self.backgrounds:
+                self.hits += 1
+                self.backgrounds.move_to_end(key)
+                return self.backgrounds[key]
+            self.misses += 1
+        # декодирование идет без блокировки: пока фоновый поток загружает уровни,
+        # игровой поток получает свои изображения, не дожидаясь его
+        image = build()
+        if not keep:
+            return image
+        with self.lock:
+            # то же изображение мог успеть загрузить другой поток: остается одна копия
+            cached = self.images.get(key, self.backgrounds.get(key))
+            if cached is not None:
+                return cached
+            self.store(key, image)
+            return image
+
+    def load(self, key):
+        '''Изображение из пакета ресурсов, иначе из файла'''
+        if key in self.pack:
+            return self.pack_surface(self.pack[key])
+        name, size_, color_key = key
+        if self.building:
+            try:
+                return scale_image(load_image(name, color_key), size_)
+            except (SystemExit, OSError):
+                # отсутствующий файл не попадает в пакет (pygame сообщает о нем FileNotFoundError,
+                # а о поврежденном - pygame.error, который load_image превращает в SystemExit)
+                return pygame.Surface(size_ if isinstance(size_, tuple) else (1, 1))
+        return scale_image(load_image(name, color_key), size_)
+
+    def store(self, key, image):
+        size_ = surface_bytes(image)
+        if size_ <= self.large_image:
+            self.images[key] = image
+            return
+        self.backgrounds[key] = image
+        self.backgrounds_bytes += size_
+        # вытесняются давно не использованные фоны; только что загруженный остается в кэше
+        while self.backgrounds_bytes > self.budget and len(self.backgrounds) > 1:
+            _, evicted = self.backgrounds.popitem(last=False)
+            self.backgrounds_bytes -= surface_bytes(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self.images.clear()
+        self.backgrounds.clear()
+        self.backgrounds_bytes = 0
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'images': len(self.images),
+            'images_bytes': sum(surface_bytes(image) for image in self.images.values()),
+            'backgrounds': len(self.backgrounds),
+            'backgrounds_bytes': self.backgrounds_bytes,
+            'budget': self.budget,
+        }
+
+    def open_pack(self):
+        '''Отображает пакет в память и читает его описание'''
+        self.pack = dict()
+        if self.building or not path.exists(self.pack_path):
+            return
+        with open(self.pack_path, 'rb') as file:
+            data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, length = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            print('Cannot use asset pack:', self.pack_path)
+            return
+        self.view = memoryview(data)
+        for entry in json.loads(bytes(self.view[HEADER.size:HEADER.size + length])):
+            name, size_, color_key = entry['key']
+            try:
+                if entry['stamp'] != source_stamp(name):
+                    continue
+            except OSError:
+                continue
+            self.pack[asset_key(name, size_, color_key)] = entry
+
+    def pack_surface(self, entry):
+        '''Поверхность над байтами пакета (без копирования)'''
+        w, h = entry['size']
+        offset, pixel_format = entry['offset'], entry['format']
+        surface = pygame.image.frombuffer(self.view[offset:offset + w * h * len(pixel_format)],
+                                          (w, h), pixel_format)
+        if entry['colorkey'] is not None:
+            surface.set_colorkey(entry['colorkey'], pygame.RLEACCEL)
+        return surface
+
+    def build_pack(self):
+        '''Собирает пакет из всех изображений, которые запрашивают модули игры'''
+        self.building = True
+        self.pack = None
+        self.clear()
+        pygame.display.set_mode((1, 1))
+        import classes
+        import main_game
+        load_lazy_assets()
+        main_game.preload_assets()
+
+        entries, chunks, offset = [], [], 0
+        for key in self.manifest:
+            name, size_, color_key = key
+            try:
+                image = scale_image(load_image(name, color_key), size_)
+            except (SystemExit, OSError):
+                continue
+            pixels, pixel_format, colorkey = image_pixels(image)
+            entries.append({'key': [name, size_, color_key], 'stamp': source_stamp(name),
+                            'size': list(image.get_size()), 'offset': offset, 'format': pixel_format,
+                            'colorkey': list(colorkey) if colorkey is not None else None})
+            padding = -len(pixels) % ALIGN
+            chunks.append(pixels + bytes(padding))
+            offset += len(pixels) + padding
+
+        # смещения считаются от начала файла: описание идет перед пикселями
+        description = json.dumps(entries).encode()
+        start = HEADER.size + len(description) + 4096
+        start += -start % ALIGN
+        for entry in entries:
+            entry['offset'] += start
+        description = json.dumps(entries).encode().ljust(start - HEADER.size)
+        with open(self.pack_path, 'wb') as file:
+            file.write(HEADER.pack(MAGIC, VERSION, len(description)))
+            file.write(description)
+            for chunk in chunks:
+                file.write(chunk)
+        self.building = False
+        self.pack = None
+        self.clear()
+        return len(entries)
+
+
+class LazyAsset:
+    """Атрибут класса, загружаемый при первом обращении (после создания окна).
+
+    load() возвращает значение, которое затем хранится в самом классе"""
+    instances = list()
+
+    def __init__(self, load):
+        self.load = load
+        self.owner = self.name = None
+        LazyAsset.instances.append(self)
+
+    def __set_name__(self, owner, name):
+        self.owner, self.name = owner, name
+
+    def __get__(self, obj, owner):
+        value = self.load()
+        setattr(self.owner, self.name, value)
+        return value
+
+
+def load_lazy_assets():
+    '''Загружает все отложенные атрибуты классов'''
+    for lazy in LazyAsset.instances:
+        getattr(lazy.owner, lazy.name)
+
+
+# общий менеджер изображений всех экранов игры
+manager = AssetManager()
+
+
+def load_asset(name, size_=None, color_key=None, keep=True):
+    '''Изображение в окончательном размере из общего менеджера'''
+    return manager.get(name, size_, color_key, keep)
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    pygame.init()
+    # модули игры импортируют assets, а не __main__: собирается их манифест
+    import assets
+    print('Assets packed:', assets.manager.build_pack())
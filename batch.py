@@ -0,0 +1,140 @@
+"""Пакетный прогон игр без отрисовки на всех ядрах процессора.
+
+Каждая игра воспроизводима по seed; результаты сводятся в распределение
+очков, долю игр, дошедших до каждого уровня, и причины проигрыша.
+
+Пример: python batch.py --games 100000 --policy scripted --workers 8"""
+import argparse
+import json
+import random
+from collections import Counter
+from multiprocessing import Pool, cpu_count
+
+from engine import Simulation, DIFFICULT, SPEED_X, SPEED_Y
+
+# лоток яйца -> положение волка, в котором яйцо ловится
+TRAY_TO_WOLF = (0, 2, 1, 3)
+
+
+def idle_policy(rng):
+    """Волк стоит на месте"""
+    return None
+
+
+def random_policy(rng, period=25):
+    """Волк переходит в случайное положение каждые period шагов"""
+    def policy(sim):
+        if sim.steps % period == 0:
+            sim.move_wolf(rng.randint(0, 3))
+    return policy
+
+
+def scripted_policy(rng):
+    """Волк встает под самое низкое яйцо"""
+    def policy(sim):
+        tray = sim.eggs.lowest_tray()
+        if tray is not None:
+            sim.move_wolf(TRAY_TO_WOLF[tray])
+    return policy
+
+
+POLICIES = {'idle': idle_policy, 'random': random_policy, 'scripted': scripted_policy}
+
+
+def play(seed, policy='scripted', max_steps=500000, rules=None):
+    """Одна игра; возвращает (очки, уровень, шаги, причина проигрыша)"""
+    sim = Simulation(seed, **(rules or {}))
+    sim.run(POLICIES[policy](random.Random(seed)), max_steps)
+    cause = f'tray_{sim.missed}' if sim.over else 'timeout'
+    return sim.total, sim.level, sim.steps, cause
+
+
+def play_chunk(args):
+    """Партия игр в одном процессе; возвращает частичную сводку"""
+    seeds, policy, max_steps, rules = args
+    scores, levels, causes = Counter(), Counter(), Counter()
+    steps = 0
+    for seed in seeds:
+        total, level, game_steps, cause = play(seed, policy, max_steps, rules)
+        scores[total] += 1
+        levels[level] += 1
+        causes[cause] += 1
+        steps += game_steps
+    return scores, levels, causes, steps
+
+
+def run_batch(games, policy='scripted', seed=0, workers=None, max_steps=500000, rules=None, chunk=1000):
+    """Прогон games игр с seed, seed + 1, ... на пуле процессов"""
+    tasks = [(range(start, min(start + chunk, seed + games)), policy, max_steps, rules)
+             for start in range(seed, seed + games, chunk)]
+    scores, levels, causes = Counter(), Counter(), Counter()
+    steps = 0
+    with Pool(workers or cpu_count()) as pool:
+        for part in pool.imap_unordered(play_chunk, tasks):
+            scores.update(part[0])
+            levels.update(part[1])
+            causes.update(part[2])
+            steps += part[3]
+    return summarize(games, scores, levels, causes, steps)
+
+
+def percentile(counts, fraction):
+    """Перцентиль по гистограмме значение -> количество"""
+    total = sum(counts.values())
+    seen = 0
+    for value in sorted(counts):
+        seen += counts[value]
+        if seen >= fraction * total:
+            return value
+    return None
+
+
+def summarize(games, scores, levels, causes, steps):
+    max_level = max(levels) if levels else 0
+    return {
+        'games': games,
+        'steps': steps,
+        'score_mean': sum(score * count for score, count in scores.items()) / games if games else 0,
+        'score_percentiles': {p: percentile(scores, p / 100) for p in (10, 50, 90, 99)},
+        'score_max': max(scores) if scores else 0,
+        'scores': dict(sorted(scores.items())),
+        # доля игр, дошедших как минимум до уровня
+        'level_reach': {level: sum(count for lvl, count in levels.items() if lvl >= level) / games
+                        for level in range(max_level + 1)},
+        'loss_causes': dict(causes.most_common()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Пакетный прогон игр без отрисовки')
+    parser.add_argument('--games', type=int, default=10000, help='число игр')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='scripted', help='поведение волка')
+    parser.add_argument('--seed', type=int, default=0, help='seed первой игры')
+    parser.add_argument('--workers', type=int, default=None, help='число процессов (по умолчанию все ядра)')
+    parser.add_argument('--max-steps', type=int, default=500000, help='предел шагов одной игры')
+    parser.add_argument('--chunk', type=int, default=1000, help='игр на одну задачу пула')
+    parser.add_argument('--difficult', default=','.join(map(str, DIFFICULT)), help='пороги уровней через запятую')
+    parser.add_argument('--egg-frequency', type=int, default=2200, help='начальный интервал появления яиц (мс)')
+    parser.add_argument('--speed-x', type=float, default=SPEED_X, help='скорость скатывания по x')
+    parser.add_argument('--speed-y', type=float, default=SPEED_Y, help='скорость скатывания по y')
+    parser.add_argument('--eggs-per-spawn', type=int, default=1, help='яиц за одно появление')
+    parser.add_argument('--vectorized', action='store_true', help='считать яйца массивами NumPy (без numpy - обычным списком)')
+    parser.add_argument('--json', help='файл для сохранения сводки')
+    args = parser.parse_args()
+
+    rules = {'difficult': tuple(int(value) for value in args.difficult.split(',') if value),
+             'egg_frequency': args.egg_frequency,
+             'speed_x': args.speed_x, 'speed_y': args.speed_y,
+             'eggs_per_spawn': args.eggs_per_spawn, 'vectorized': args.vectorized}
+    summary = run_batch(args.games, args.policy, args.seed, args.workers, args.max_steps, rules, args.chunk)
+    summary['rules'] = rules
+    summary['policy'] = args.policy
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(summary, file, indent=2, ensure_ascii=False)
+    for key in ('games', 'steps', 'score_mean', 'score_percentiles', 'score_max', 'level_reach', 'loss_causes'):
+        print(f'{key}: {summary[key]}')
+
+
+if __name__ == '__main__':
+    main()
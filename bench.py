@@ -0,0 +1,433 @@
+"""Замеры производительности игры и меню без окна и звука.
+
+Игровой цикл (run_game) проигрывает команды волка, заранее рассчитанные
+без отрисовки, на каждом уровне сложности, при порогах 200 и 250 очков и в
+режиме "хаос" (сотни яиц одновременно); экраны меню получают заготовленные
+нажатия клавиш и движения мыши на базе с большим числом игроков. Каждый кадр игры выполняется
+без ожидания, время кадра - интервал между выводами на экран. Меню
+перерисовываются только при изменениях, поэтому для них измеряется задержка
+от выдачи события до вывода на экран. Отдельный проход с tracemalloc
+считает выделения памяти за кадр. Результат сравнивается с сохраненным
+базовым замером: замедление сверх допуска возвращает код ошибки.
+
+Пример: python bench.py --save-baseline bench_baseline.json
+        python bench.py --baseline bench_baseline.json"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from os import path
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+import main_game
+from batch import scripted_policy
+from classes import LEVELS
+from database import Database
+from engine import Simulation, DIFFICULT
+from my_tools import img_dir
+from view import view
+
+# уровни сложности: сценарий -> очки, с которых начинается игра
+TIERS = {'level_1': 0, 'level_2': DIFFICULT[0], 'level_3': DIFFICULT[1], 'total_200': 200, 'total_250': 250}
+# режим "хаос": пачки по CHAOS_EGGS яиц каждые 500 мс, одновременно в игре 600-700 яиц
+CHAOS_RULES = {'vectorized': True, 'eggs_per_spawn': main_game.CHAOS_EGGS, 'egg_frequency': 500}
+# цвета фонов уровней, подставляемых вместо отсутствующих изображений
+PLACEHOLDER_COLORS = ((200, 220, 200), (200, 200, 230), (230, 210, 190))
+# метрики, по которым ищется замедление, и абсолютный порог (мс), ниже которого разница - шум
+COMPARED = {'frames': ('p50', 'p95', 'p99'), 'menus': ('p50', 'p95', 'p99'), 'db': ('p50', 'p95')}
+NOISE_MS = 0.05
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def at(fraction):
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+    return {'mean': sum(values) / len(values), 'p50': at(0.5), 'p95': at(0.95), 'p99': at(0.99),
+            'max': values[-1], 'count': len(values)}
+
+
+class NoWaitClock:
+    """Замена pygame.time.Clock: кадры идут подряд, tick возвращает прошедшее время"""
+
+    def __init__(self):
+        self.last = time.perf_counter()
+
+    def tick(self, framerate=0):
+        now = time.perf_counter()
+        elapsed, self.last = now - self.last, now
+        return int(elapsed * 1000)
+
+    def get_fps(self):
+        return 0.0
+
+
+class FrameTimer:
+    """Время и выделения памяти каждого кадра: кадр заканчивается выводом на экран;
+    с источником событий script - и задержка от выдачи события до вывода"""
+
+    def __init__(self, allocations=False, script=None):
+        self.allocations = allocations
+        self.script = script
+        self.times = []  # мс
+        self.latencies = []  # мс от выдачи событий до вывода на экран
+        self.allocated = []  # Кб, выделенные за кадр (пик tracemalloc)
+        self.blocks = []  # прирост числа блоков памяти за кадр
+
+    def __enter__(self):
+        self.flip, self.update, self.clock = pygame.display.flip, pygame.display.update, pygame.time.Clock
+        pygame.display.flip = self.on_flip
+        pygame.display.update = self.on_update
+        pygame.time.Clock = NoWaitClock
+        if self.allocations:
+            tracemalloc.start()
+            self.memory = tracemalloc.get_traced_memory()[0]
+        self.block_count = sys.getallocatedblocks()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        pygame.display.flip, pygame.display.update, pygame.time.Clock = self.flip, self.update, self.clock
+        if self.allocations:
+            tracemalloc.stop()
+
+    def on_flip(self):
+        self.flip()
+        self.frame()
+
+    def on_update(self, *rects):
+        self.update(*rects)
+        self.frame()
+
+    def frame(self):
+        now = time.perf_counter()
+        self.times.append((now - self.start) * 1000)
+        if self.script is not None and self.script.delivered is not None:
+            self.latencies.append((now - self.script.delivered) * 1000)
+            self.script.delivered = None
+        if self.allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            self.allocated.append((peak - self.memory) / 1024)
+            tracemalloc.reset_peak()
+            self.memory = current
+        block_count = sys.getallocatedblocks()
+        self.blocks.append(block_count - self.block_count)
+        self.block_count = block_count
+        self.start = time.perf_counter()
+
+
+class ScriptedInput:
+    """Подменяет очередь событий: кадр за кадром отдает заготовленные события,
+    а когда они кончатся - QUIT (при quit_when_done=False - пустые списки).
+    MOUSEMOTION передвигает мышь; delivered - время выдачи последних событий"""
+
+    def __init__(self, frames, mouse=(0, 0), quit_when_done=True):
+        self.frames = list(frames)
+        self.mouse = mouse
+        self.quit_when_done = quit_when_done
+        self.delivered = None
+
+    def __enter__(self):
+        self.get, self.wait, self.get_pos = pygame.event.get, pygame.event.wait, pygame.mouse.get_pos
+        self.pending = None  # события кадра, оставшиеся после event.wait (их заберет event.get)
+        pygame.event.get = self.next_events
+        pygame.event.wait = self.next_event
+        pygame.mouse.get_pos = lambda: self.mouse
+        return self
+
+    def __exit__(self, *exc):
+        pygame.event.get, pygame.event.wait, pygame.mouse.get_pos = self.get, self.wait, self.get_pos
+
+    def next_events(self, *args, **kwargs):
+        if self.pending is not None:
+            events, self.pending = self.pending, None
+            return events
+        self.get()  # системные события обрабатываются, но не передаются экрану
+        if not self.frames:
+            return [pygame.event.Event(pygame.QUIT)] if self.quit_when_done else []
+        events = self.frames.pop(0)
+        for event in events:
+            if event.type == pygame.MOUSEMOTION:
+                self.mouse = event.pos
+        if events:
+            self.delivered = time.perf_counter()
+        return events
+
+    def next_event(self, *args, **kwargs):
+        """event.wait без ожидания: первое событие кадра, пустой кадр - NOEVENT (истек timeout)"""
+        events = self.next_events()
+        if not events:
+            return pygame.event.Event(pygame.NOEVENT)
+        self.pending = events[1:]
+        return events[0]
+
+
+def key(code, unicode=''):
+    return pygame.event.Event(pygame.KEYDOWN, key=code, unicode=unicode, mod=0)
+
+
+def typed(text):
+    return [[key(0, char)] for char in text]
+
+
+def motion(pos):
+    return pygame.event.Event(pygame.MOUSEMOTION, pos=pos, rel=(0, 0), buttons=(0, 0, 0))
+
+
+def tier_simulation(seed, total, rules):
+    """Симуляция, дошедшая до total очков так, как если бы очки набирались по одному;
+    жизни не кончаются, чтобы сценарий шел заданное число кадров"""
+    sim = Simulation(seed, **rules)
+    for threshold in sorted(set(DIFFICULT) | {200, 250}):
+        if threshold <= total:
+            sim.total = threshold
+            sim.check_level()
+    sim.total = total
+    sim.life = 10 ** 6
+    return sim
+
+
+def game_log(seed, total, rules, frames):
+    """Команды волка на frames шагов от начала уровня (рассчитываются без отрисовки)"""
+    sim = tier_simulation(seed, total, rules)
+    sim.log = []
+    sim.run(scripted_policy(random.Random(seed)), frames)
+    return {'seed': seed, 'rules': rules, 'inputs': sim.log, 'steps': sim.steps, 'total': sim.total}
+
+
+def bench_game(screen, total, rules, frames, seed, dirty, allocations=False):
+    log = game_log(seed, total, rules, frames)
+    # команды волка берутся из записи, события игроку не нужны
+    with FrameTimer(allocations) as timer, ScriptedInput([], quit_when_done=False):
+        main_game.run_game(screen, None, dirty=dirty, replay=log, fast=True,
+                           sim=tier_simulation(seed, total, rules))
+    return timer
+
+
+def menu_scripts(frames, monitor_rect):
+    """Нажатия клавиш и движения мыши для экранов меню: экран -> (функция запуска, события по кадрам)"""
+    idle = [[] for count in range(frames // 4)]
+    selection = (idle + [[key(pygame.K_DOWN)] for count in range(frames // 4)]
+                 + [[key(pygame.K_PAGEDOWN)] for count in range(frames // 8)]
+                 + typed('user_1') + [[key(pygame.K_BACKSPACE)] for count in range(6)]
+                 + [[key(pygame.K_PAGEUP)] for count in range(frames // 8)] + idle
+                 + [[key(pygame.K_RETURN)]])
+    name = f'bench_{time.time_ns()}'
+    registration = (idle + typed('user_1') + [[key(pygame.K_RETURN)]] + idle
+                    + [[key(pygame.K_BACKSPACE)] for count in range(6)] + typed(name) + [[key(pygame.K_RETURN)]])
+    # мышь по очереди над кнопками экрана результатов и мимо них: каждое движение меняет подсветку
+    center_x, bottom = monitor_rect.centerx, monitor_rect.bottom
+    points = ((center_x, bottom - 125), (center_x, bottom - 55), (center_x, bottom - 250))
+    results = idle + [[motion(points[count % len(points)])] for count in range(frames)] + [[key(pygame.K_q)]]
+    return {
+        'menu_user_selection': (lambda screen: main_game.show_user_selection_screen(screen), selection),
+        'menu_registration': (lambda screen: main_game.show_registration_screen(screen), registration),
+        'menu_results': (lambda screen: main_game.show_results_screen(screen, 'user_1', 123), results),
+    }
+
+
+def bench_menu(screen, show, events, allocations=False):
+    with ScriptedInput(events) as script, FrameTimer(allocations, script) as timer:
+        show(screen)
+    return timer
+
+
+def missing_levels():
+    """Фоны уровней, которых нет в каталоге изображений"""
+    return [name for name in LEVELS.values() if not path.exists(path.join(img_dir, name))]
+
+
+def placeholder_level(level, size_, keep=True):
+    """Одноцветный фон уровня вместо отсутствующего изображения (на время кадра не влияет:
+    фон собирается один раз)"""
+    surface = pygame.Surface(size_)
+    surface.fill(PLACEHOLDER_COLORS[level % len(PLACEHOLDER_COLORS)])
+    return surface
+
+
+def fill_users(db, users):
+    """Игроки user_0 ... user_N с рекордами (много одинаковых)"""
+    rng = random.Random(0)
+    now = '2026-01-01T00:00:00'
+    with db.conn:
+        db.conn.executemany(
+            'INSERT INTO users (username, registration_date, last_played, highscore) VALUES (?, ?, ?, ?)',
+            ((f'user_{number}', now, now, rng.randint(0, 300)) for number in range(users)))
+    # игроки добавлены в обход register_user: статистика и дерево рекордов пересчитываются
+    db.rebuild_stats()
+
+
+def db_latency(db, repeat):
+    """Время основных запросов к базе (мс)"""
+    operations = {
+        'first_page': lambda: db.users_page(12),
+        'deep_page': lambda: db.users_page(12, (150, 1000)),
+        'previous_page': lambda: db.users_page(12, (150, 1000), backward=True),
+        'search': lambda: db.users_page(12, prefix='user_12'),
+        'highscore': lambda: db.highscore('user_1'),
+        'player_stats': lambda: db.player_stats('user_1'),
+        'save_sessions': lambda: db.save_sessions([('user_1', 10, '2026-01-01T00:00:00')] * 64),
+    }
+    result = dict()
+    for name, operation in operations.items():
+        times = []
+        for count in range(repeat):
+            start = time.perf_counter()
+            operation()
+            times.append((time.perf_counter() - start) * 1000)
+        result[name] = percentiles(times)
+    return result
+
+
+def run_benchmarks(frames=600, alloc_frames=200, users=100000, seed=0, dirty=False, repeat=200, only=None,
+                   render_scale=1.0):
+    pygame.init()
+    pygame.mixer.init()
+    screen = pygame.display.set_mode(main_game.size)
+    view.render_scale = render_scale
+    board = view.board()  # поверхность игрового поля (в половинном масштабе - меньше окна)
+    record_games = main_game.RECORD_GAMES
+    main_game.RECORD_GAMES = False
+    scenarios = {name: (bench_game, (total, {}, frames, seed, dirty)) for name, total in TIERS.items()}
+    scenarios['chaos'] = (bench_game, (0, CHAOS_RULES, frames, seed, dirty))
+    missing = missing_levels()
+    load_level = main_game.load_level
+    if missing:
+        print(f'Placeholder level backgrounds: missing {", ".join(missing)} in {img_dir}', file=sys.stderr)
+        main_game.load_level = placeholder_level
+
+    game_db = main_game.db
+    with tempfile.TemporaryDirectory() as directory:
+        main_game.db = db = Database(path.join(directory, 'bench.sqlite'))
+        fill_users(db, users)
+        for name, (show, events) in menu_scripts(frames, main_game.draw_monitor_surface(screen)).items():
+            scenarios[name] = (bench_menu, (show, events))
+
+        report = {'frames': dict(), 'menus': dict(), 'allocations': dict()}
+        try:
+            for name, (bench, args) in scenarios.items():
+                if only and name not in only:
+                    continue
+                target = board if bench is bench_game else screen
+                timer = bench(target, *args)
+                if bench is bench_game:
+                    report['frames'][name] = percentiles(timer.times)
+                else:
+                    report['menus'][name] = percentiles(timer.latencies)
+                # выделения памяти считаются отдельным, более коротким проходом: tracemalloc замедляет кадры
+                if bench is bench_game:
+                    args = args[:2] + (alloc_frames,) + args[3:]
+                timer = bench(target, *args, allocations=True)
+                report['allocations'][name] = {'kb_per_frame': percentiles(timer.allocated),
+                                               'blocks_per_frame': percentiles(timer.blocks)}
+            report['db'] = db_latency(db, repeat)
+        finally:
+            db.close()
+            main_game.db = game_db
+            main_game.RECORD_GAMES = record_games
+            main_game.load_level = load_level
+    report['config'] = {'placeholder_levels': missing, 'frames': frames, 'alloc_frames': alloc_frames, 'users': users, 'seed': seed,
+                        'dirty': dirty, 'render_scale': render_scale, 'python': sys.version.split()[0], 'pygame': pygame.version.ver}
+    pygame.quit()
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Список замедлений относительно базового замера: (раздел, сценарий, метрика, было, стало)"""
+    regressions = []
+    for section, compared in COMPARED.items():
+        for name, metrics in report.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            for metric in compared:
+                before, after = old.get(metric), metrics.get(metric)
+                if before is None or after is None:
+                    continue
+                if after > before * (1 + tolerance) and after - before > NOISE_MS:
+                    regressions.append((section, name, metric, before, after))
+    return regressions
+
+
+def missing_scenarios(report, baseline, only=None):
+    """Сценарии базового замера, которых нет в отчете: (раздел, сценарий)"""
+    return [(section, name) for section in COMPARED for name in baseline.get(section, {})
+            if name not in report.get(section, {}) and (not only or name in only)]
+
+
+def print_frames(report, name, stats):
+    if not stats:
+        print(f'{name:24} no frames')
+        return
+    allocations = report['allocations'].get(name, {})
+    kb = allocations.get('kb_per_frame', {}).get('mean', 0)
+    blocks = allocations.get('blocks_per_frame', {}).get('mean', 0)
+    count = f' {stats["count"]:7}' if name in report['menus'] else ''
+    print(f'{name:24} {stats["mean"]:7.2f} {stats["p50"]:7.2f} {stats["p95"]:7.2f} {stats["p99"]:7.2f} '
+          f'{stats["max"]:7.2f} {kb:7.1f} {blocks:7.1f}{count}')
+
+
+def print_report(report):
+    print(f'{"frame time, ms":24} {"mean":>7} {"p50":>7} {"p95":>7} {"p99":>7} {"max":>7} {"kb/fr":>7} {"blk/fr":>7}')
+    for name, stats in report['frames'].items():
+        print_frames(report, name, stats)
+    print(f'{"menu event latency, ms":24} {"mean":>7} {"p50":>7} {"p95":>7} {"p99":>7} {"max":>7} {"kb/fr":>7} '
+          f'{"blk/fr":>7} {"events":>7}')
+    for name, stats in report['menus'].items():
+        print_frames(report, name, stats)
+    print(f'{"database, ms":24} {"mean":>7} {"p50":>7} {"p95":>7} {"p99":>7} {"max":>7}')
+    for name, stats in report['db'].items():
+        print(f'{name:24} {stats["mean"]:7.3f} {stats["p50"]:7.3f} {stats["p95"]:7.3f} {stats["p99"]:7.3f} '
+              f'{stats["max"]:7.3f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Замеры производительности игры и меню без окна')
+    parser.add_argument('--frames', type=int, default=600, help='кадров в каждом сценарии')
+    parser.add_argument('--alloc-frames', type=int, default=200, help='кадров игры в проходе с tracemalloc')
+    parser.add_argument('--users', type=int, default=100000, help='игроков в базе для экранов меню')
+    parser.add_argument('--seed', type=int, default=0, help='seed игр')
+    parser.add_argument('--repeat', type=int, default=200, help='повторов каждого запроса к базе')
+    parser.add_argument('--dirty', action='store_true', help='выводить только изменившиеся области кадра')
+    parser.add_argument('--render-scale', type=float, default=1.0, help='масштаб отрисовки игрового поля')
+    parser.add_argument('--only', nargs='*', help='только указанные сценарии')
+    parser.add_argument('--json', help='файл для сохранения результатов')
+    parser.add_argument('--baseline', help='базовый замер для сравнения')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='допустимое замедление (доля)')
+    parser.add_argument('--save-baseline', help='сохранить результаты как базовый замер')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.frames, args.alloc_frames, args.users, args.seed, args.dirty, args.repeat, args.only,
+                            args.render_scale)
+    print_report(report)
+    for file_name in (args.json, args.save_baseline):
+        if file_name:
+            with open(file_name, 'w') as file:
+                json.dump(report, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        for section, name, metric, before, after in regressions:
+            print(f'SLOWER {section}/{name} {metric}: {before:.3f} -> {after:.3f} ms')
+        # несравненный сценарий не должен выглядеть как отсутствие замедлений
+        missing = missing_scenarios(report, baseline, args.only)
+        for section, name in missing:
+            print(f'MISSING {section}/{name}: in the baseline, not measured')
+        if regressions or missing:
+            sys.exit(1)
+        print('no regressions')
+
+
+if __name__ == '__main__':
+    main()
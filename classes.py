@@ -1,22 +1,20 @@
 import pygame
-from my_tools import load_image, width, height
+from my_tools import rotation_atlas, get_font, render_text, width, height
+from assets import load_asset, LazyAsset
+from sounds import sound_bank
+from view import view, scaled, scaled_point
 from math import sqrt
-import random
+# правила игры и расположение лотков задаются в симуляции
+from engine import EGG_SIZE, ROT_STEP, MOVE_WOLF, TOGGLE_SPAWN, points_catch
 
 pygame.init()
 
-# события в игре:
-EGG = pygame.USEREVENT + 1  # появление яйца в лотке
-CATCH = pygame.USEREVENT + 2  # яйцо поймано
-NO_CATCH = pygame.USEREVENT + 3  # яйцо не поймано
-
-pause_state = False
+# предельное число шагов симуляции за кадр (защита от накопления отставания)
+MAX_STEPS = 10
 # коэффициент для изображений волка
 ratio = 1.1
 # шрифт (по умолчанию) для отображения счета
-FONT = pygame.font.Font(None, 60)
-# информация об уровнях перехода на следующий уровень
-DIFFICULT = (50, 100)
+FONT = get_font(60)
 # шкала для уменьшения изображения волка
 SCALES = (380, 406, 416, 429)
 # информация о файлах, хранящих изображения
@@ -28,77 +26,134 @@ PUSH = {'game': ('off.png', 'on.png'),
         'pause': ('pause_off.png', 'pause_on.png'),
         'setting': ('setting.png', '')}
 
-all_sprites = pygame.sprite.Group()
-control_sprites = pygame.sprite.Group()
-
+# громкость музыки игры при включенном звуке
+LEVEL_MUSIC = 0.4
+# клавиши управления: клавиша -> команда симуляции (положение волка или остановка появления яиц)
+KEYS = {1073741919: (MOVE_WOLF, 0), pygame.K_END: (MOVE_WOLF, 0),
+        1073741921: (MOVE_WOLF, 1), pygame.K_HOME: (MOVE_WOLF, 1),
+        1073741915: (MOVE_WOLF, 3), pygame.K_UP: (MOVE_WOLF, 3),
+        1073741913: (MOVE_WOLF, 2), pygame.K_DOWN: (MOVE_WOLF, 2),
+        pygame.K_SPACE: (TOGGLE_SPAWN, 0)}
+# раскладки мест автомата на несколько игр в одном окне
+SEAT_KEYS = (
+    {pygame.K_END: (MOVE_WOLF, 0), pygame.K_HOME: (MOVE_WOLF, 1), pygame.K_DOWN: (MOVE_WOLF, 2),
+     pygame.K_UP: (MOVE_WOLF, 3), pygame.K_SPACE: (TOGGLE_SPAWN, 0)},
+    {pygame.K_q: (MOVE_WOLF, 0), pygame.K_e: (MOVE_WOLF, 1), pygame.K_a: (MOVE_WOLF, 2),
+     pygame.K_d: (MOVE_WOLF, 3), pygame.K_s: (TOGGLE_SPAWN, 0)},
+    {pygame.K_u: (MOVE_WOLF, 0), pygame.K_o: (MOVE_WOLF, 1), pygame.K_j: (MOVE_WOLF, 2),
+     pygame.K_l: (MOVE_WOLF, 3), pygame.K_k: (TOGGLE_SPAWN, 0)},
+    {pygame.K_KP7: (MOVE_WOLF, 0), pygame.K_KP9: (MOVE_WOLF, 1), pygame.K_KP1: (MOVE_WOLF, 2),
+     pygame.K_KP3: (MOVE_WOLF, 3), pygame.K_KP5: (TOGGLE_SPAWN, 0)},
+)
+
+# положения и размеры ниже - в логических координатах окна; спрайты поля
+# переводят их в масштаб поверхности игрового поля (view.render_scale)
 # позиционирование переключателя (on/off) звука
 points_switch = (55, 190)
-switch_on = False  # информация о начальном состоянии переключателя
 # позиционирование кнопок управления
 points_push = ((1240, 105), (1240, 290), (45, 35))
-push_on = [False] * 3  # информация о состоянии кнопок управления
-# точки коллизий яйцо-корзинка
-points_catch = ((550, 451), (912, 443), (490, 615), (912, 607))
-#  точки появления выкатывающихся яиц
-points_egg = ((195, 193), (195, 385), (1155, 193), (1155, 385))
 # позиционирование цыплят (отображение "жизней"-попыток)
 points_chicken = tuple([(width // 2 - width // 12 + 80 * count, height // 4) for count in range(3)])
 # позиционирование волка
 top, bottom = 490, 340
 points_wolf = (top, bottom)
-# позиционирование разбившихся яиц
-points_egg_break = ([450, 610], [840, 610])
 
 
-class Game:
-    def __init__(self, size_):
-        self.size = size_
-        self.width, self.height = self.size
-        self.points = {
-            'switch': (55, 190), 'push': ((1240, 105), (1240, 290), (45, 35)),
-            'egg_catch': ((550, 451), (912, 443), (490, 615), (912, 607)),
-            'egg_break': ([450, 610], [840, 610]),
-            'egg': ((195, 193), (195, 385), (1155, 193), (1155, 385)),
-            'wolf': (490, 340),
-            'chicken': tuple(
-                [(self.width // 2 - self.width // 12 + 80 * count, self.height // 4) for count in range(3)])
-        }
-        self.pieces_sprites = pygame.sprite.Group()
-        self.control_sprites = pygame.sprite.Group()
+def merge_rects(rects):
+    """Объединяет пересекающиеся прямоугольники"""
+    merged = []
+    for rect in rects:
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect = rect.union(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class DirtyRenderer:
+    """Вывод на экран только изменившихся с прошлого кадра областей"""
+
+    def __init__(self, screen, *groups):
+        self.screen = screen
+        self.groups = groups
+        self.sprites = dict()  # спрайт -> (прямоугольник, изображение) на прошлом кадре
+        self.full = True  # следующий кадр выводится целиком
+
+    def invalidate(self):
+        self.full = True
+
+    def dirty_rects(self, extra=()):
+        """Области, в которых кадр изменился"""
+        rects = list(extra)
+        current = dict()
+        for group in self.groups:
+            for sprite in group:
+                state = current[sprite] = (sprite.rect.copy(), sprite.image)
+                old = self.sprites.pop(sprite, None)
+                if old is None:
+                    rects.append(state[0])
+                elif old[0] != state[0] or old[1] is not state[1]:
+                    rects.append(old[0].union(state[0]))
+        # исчезнувшие спрайты
+        rects.extend(rect for rect, image in self.sprites.values())
+        self.sprites = current
+        screen_rect = self.screen.get_rect()
+        return merge_rects([rect.clip(screen_rect) for rect in rects if rect.colliderect(screen_rect)])
+
+    def render(self, draw, extra=()):
+        """Рисует кадр функцией draw(screen) в изменившихся областях; возвращает их (None - весь кадр)"""
+        rects = self.dirty_rects(extra)
+        if self.full:
+            self.full = False
+            draw(self.screen)
+            return None
+        for rect in rects:
+            self.screen.set_clip(rect)
+            draw(self.screen)
+        self.screen.set_clip(None)
+        return rects
+
+    @staticmethod
+    def update(rects):
+        """Выводит на экран области, нарисованные render"""
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def present(self, draw, extra=()):
+        """Рисует кадр функцией draw(screen) и выводит изменившиеся области"""
+        self.update(self.render(draw, extra))
 
 
 class Switch(pygame.sprite.Sprite):
-    images = [pygame.transform.scale(load_image(SWITCH[count], -1), (100, 70)) for count in range(2)]
+    images = LazyAsset(lambda: [load_asset(SWITCH[count], scaled_point((100, 70)), -1) for count in range(2)])
 
-    def __init__(self, figure, state, point):
-        super().__init__(control_sprites)
+    def __init__(self, figure, state, point, *groups):
+        super().__init__(*groups)
         self.image = Switch.images[figure]
         self.switch = state
         self.rect = self.image.get_rect()
-        self.rect.x = point[0]
-        self.rect.y = point[1]
+        self.rect.x, self.rect.y = scaled_point(point)
 
     def change_switch(self, figure):
         self.image = Switch.images[figure]
 
 
 class Push(pygame.sprite.Sprite):
-    images = list()
-    for key in PUSH:
-        for count in range(2):
-            if PUSH[key][count]:
-                images.append(pygame.transform.scale(load_image(PUSH[key][count], -1), (115, 115)))
-
-    def __init__(self, figure, state, point_push):
-        super().__init__(control_sprites)
+    images = LazyAsset(lambda: [load_asset(PUSH[key][count], scaled_point((115, 115)), -1)
+                                for key in PUSH for count in range(2) if PUSH[key][count]])
+
+    def __init__(self, figure, state, point_push, *groups):
+        super().__init__(*groups)
         self.image = Push.images[figure]
         self.push = state
         self.figure = figure
         self.rect = self.image.get_rect()
         self.mask = pygame.mask.from_surface(self.image)
-        self.radius = 45
-        self.rect.x = point_push[0]
-        self.rect.y = point_push[1]
+        self.radius = scaled(45)
+        self.rect.x, self.rect.y = scaled_point(point_push)
 
     def change_push(self, figure):
         self.image = Push.images[figure]
@@ -110,125 +165,317 @@ class Push(pygame.sprite.Sprite):
 
 
 class Wolf(pygame.sprite.Sprite):
-    images = [pygame.transform.scale(
-        load_image(PLACES[count], -1), (int(SCALES[count] * ratio), int(330 * ratio))) for count in range(4)]
+    images = LazyAsset(lambda: [load_asset(PLACES[count],
+                                           scaled_point((int(SCALES[count] * ratio), int(330 * ratio))), -1)
+                                for count in range(4)])
 
-    def __init__(self, figure, point):
-        super().__init__(all_sprites)
-        delta = 0 if figure != 3 else 40
-        self.image = Wolf.images[figure]
-        self.point = points_catch[figure]
-        self.rect = self.image.get_rect()
-        self.rect.x = point[0] - delta
-        self.rect.y = point[1]
+    def __init__(self, figure, point, *groups):
+        super().__init__(*groups)
+        self.move(figure, point, points_catch[figure])
 
     def move(self, figure, point, point_catch):
         delta = 0 if figure != 3 else 40
         self.image = Wolf.images[figure]
         self.point = point_catch
         self.rect = self.image.get_rect()
-        self.rect.x = point[0] - delta
-        self.rect.y = point[1]
+        self.rect.x, self.rect.y = scaled_point((point[0] - delta, point[1]))
 
 
 class Chicken(pygame.sprite.Sprite):
-    image = load_image('chicken.png', -1)
-    image = pygame.transform.scale(image, (70, 85))
+    image = LazyAsset(lambda: load_asset('chicken.png', scaled_point((70, 85)), -1))
 
-    def __init__(self, pos):
-        super().__init__(all_sprites)
+    def __init__(self, pos, *groups):
+        super().__init__(*groups)
         self.image = Chicken.image
         self.rect = self.image.get_rect()
         self.last_update = pygame.time.get_ticks()
-        self.rect.x = pos[0]
-        self.rect.y = pos[1]
+        self.rect.x, self.rect.y = scaled_point(pos)
+
+
+class SpritePool:
+    """Повторное использование спрайтов: убранные из групп спрайты ждут новой выдачи
+    (в той же или в другой игре)"""
+
+    def __init__(self, sprite_class):
+        self.sprite_class = sprite_class
+        self.free = []
+
+    def acquire(self, groups, *args):
+        """Спрайт с параметрами args в группах groups"""
+        if not self.free:
+            return self.sprite_class(*args, *groups)
+        sprite = self.free.pop()
+        sprite.add(*groups)
+        sprite.reset(*args)
+        return sprite
+
+    def release(self, sprite):
+        sprite.kill()
+        self.free.append(sprite)
 
 
 class EggBreak(pygame.sprite.Sprite):
-    image = load_image('break_egg.png', -1)
-    image = pygame.transform.scale(image, (100, 100))
+    image = LazyAsset(lambda: load_asset('break_egg.png', scaled_point((100, 100)), -1))
 
-    def __init__(self, pos, delta):
-        super().__init__(all_sprites)
+    def __init__(self, state, *groups):
+        super().__init__(*groups)
         self.image = EggBreak.image
         self.rect = self.image.get_rect()
-        self.last_update = pygame.time.get_ticks()
-        self.rect.x = pos[0]
-        self.rect.y = pos[1] + delta
+        self.reset(state)
 
-    def erase_break_egg(self):
-        now = pygame.time.get_ticks()
-        if now - self.last_update > 1000:
-            self.kill()
-
-    def update(self, none):
-        self.erase_break_egg()
+    def reset(self, state):
+        self.state = state  # разбитое яйцо в симуляции (engine.BreakState)
+        self.rect.x, self.rect.y = scaled_point((state.x, state.y))
 
 
 class Egg(pygame.sprite.Sprite):
-    image = load_image('egg_0.png', -1)
-    image = pygame.transform.scale(image, (40, 50))
+    image = LazyAsset(lambda: load_asset('egg_0.png', scaled_point(EGG_SIZE), -1))
+    # повёрнутые изображения яйца для всех углов: угол -> (изображение, маска, прямоугольник)
+    atlas = LazyAsset(lambda: rotation_atlas(Egg.image, ROT_STEP))
 
-    def __init__(self, pos):
-        super().__init__(all_sprites)
-        self.image = Egg.image
-        self.rect = self.image.get_rect()
-        self.up = True if pos[1] < height // 3 else False  # верхний/нижний лоток
-        self.rect.x = pos[0]
-        self.rect.y = pos[1]
-        self.last_update = pygame.time.get_ticks()
-        self.speed_y = 1.99
-        self.speed_x = 2.5
-        self.rot = 0
-        if self.rect.x == 195:
-            self.direct = -1
-        else:
-            self.direct = 1
-        self.rot_speed = self.direct * 7
-
-    def rotate(self):
-        now = pygame.time.get_ticks()
-        if now - self.last_update > 10:
-            self.last_update = now
-            self.rot = (self.rot + self.rot_speed) % 360
-            new_image = pygame.transform.rotate(Egg.image, self.rot)
-            old_center = self.rect.center
-            self.image = new_image
-            self.rect = self.image.get_rect()
-            self.rect.center = old_center
-
-    def update(self, point):
-        self.rotate()
-        if not self.rect.collidepoint(point):
-            if self.direct < 0:
-                # левая сторона
-                if self.rect.x <= 490:
-                    #  яйцо скатывается
-                    self.rect = self.rect.move(
-                        -self.direct * self.speed_x, self.speed_y) if self.up else self.rect.move(
-                        -self.direct * self.speed_x, self.speed_y - 0.39)
-                else:
-                    #  яйцо падает отвесно
-                    self.rect = self.rect.move(0, self.speed_y * 2)
+    def __init__(self, *groups):
+        super().__init__(*groups)
+        self.reset()
+
+    def reset(self):
+        self.show(0, (0, 0))
+
+    def show(self, rot, center):
+        """Изображение яйца, повернутого на угол rot, с центром в точке center"""
+        self.image, self.mask, rect = Egg.atlas[rot]
+        self.rect = rect.move(center)
+
+
+# пулы спрайтов яиц и разбитых яиц (общие для всех игр процесса):
+# в установившейся игре новые спрайты не создаются
+egg_pool = SpritePool(Egg)
+break_pool = SpritePool(EggBreak)
+
+
+def sync_eggs(sprites, eggs, alpha, *groups):
+    """Спрайты только рисуют яйца симуляции: по спрайту на яйцо, положение между шагами"""
+    views = eggs.views(alpha)
+    while len(sprites) < len(views):
+        sprites.append(egg_pool.acquire(groups))
+    while len(sprites) > len(views):
+        egg_pool.release(sprites.pop())
+    scale = view.render_scale
+    if scale == 1:
+        for sprite, (rot, x, y) in zip(sprites, views):
+            sprite.show(rot, (x, y))
+    else:
+        for sprite, (rot, x, y) in zip(sprites, views):
+            sprite.show(rot, (round(x * scale), round(y * scale)))
+
+
+def sync_sprites(sprites, states, pool, *groups):
+    """Выдает из пула спрайты для новых объектов симуляции и возвращает спрайты исчезнувших.
+
+    sprites - словарь объект симуляции -> спрайт"""
+    for state in states:
+        if state not in sprites:
+            sprites[state] = pool.acquire(groups, state)
+    if len(sprites) != len(states):
+        alive = set(states)
+        for state in [state for state in sprites if state not in alive]:
+            pool.release(sprites.pop(state))
+
+
+class MusicSwitch:
+    """Музыка автомата: одна на все поля окна, поэтому и переключатель у нее один"""
+
+    def __init__(self):
+        self.on = False
+
+    def volume(self):
+        return LEVEL_MUSIC if self.on else 0
+
+    def toggle(self):
+        self.on = not self.on
+        sound_bank.set_music_volume(self.volume())
+
+
+music_switch = MusicSwitch()
+
+
+class Game:
+    """Одна игра на своей поверхности: симуляция, спрайты, кнопки и состояние управления.
+
+    Изображения, звуки и пулы спрайтов общие для всех игр процесса,
+    поэтому несколько игр могут идти одновременно на частях одного окна.
+    backgrounds - функция: уровень -> собранный фон поля"""
+
+    def __init__(self, screen, sim, backgrounds, monitor, help_overlay, player=None, keys=KEYS):
+        self.screen = screen
+        self.sim = sim
+        self.player = player  # воспроизведение записи: команды игрока берутся из нее
+        self.keys = keys
+        self.backgrounds = backgrounds
+        self.level = sim.level
+        self.background = backgrounds(self.level)
+        self.monitor = monitor
+        self.help_overlay = help_overlay
+        self.all_sprites = pygame.sprite.Group()
+        self.control_sprites = pygame.sprite.Group()
+        self.pause_state = False
+        self.push_on = [False, False]  # игра включена, пауза
+        self.show_help = False
+        self.eggs = []  # спрайты яиц
+        self.breaks = dict()  # разбитые яйца симуляции -> спрайты
+        self.wolf = Wolf(sim.wolf, points_wolf, self.all_sprites)
+        self.chickens = [Chicken(points_chicken[count], self.all_sprites) for count in range(3)]
+        # переключатель поля показывает общее состояние музыки (music_switch)
+        self.switch_sound = Switch(int(music_switch.on), music_switch.on, points_switch, self.control_sprites)
+        self.push_turn = Push(0, False, points_push[0], self.control_sprites)  # Кнопка включения
+        self.push_enable = Push(2, False, points_push[1], self.control_sprites)  # Кнопка паузы
+        self.push_info = Push(4, False, points_push[2], self.control_sprites)  # Кнопка настроек
+        self.renderer = DirtyRenderer(screen, self.all_sprites, self.control_sprites)
+        self.changed = []  # изменившиеся области вне спрайтов
+        self.overlay_state = (self.pause_state, self.show_help)
+        self.hud = None  # панель производительности (perf.PerfHud)
+        # шрифт счета и надписей поля в масштабе поля
+        self.font = get_font(scaled(60))
+        self.shown_total = 0
+        self.counter, self.box = self.score(self.shown_total)
+        self.lag = 0  # накопленное, но еще не просимулированное время (мс)
+        self.running = True
+
+    def score(self, total):
+        counter = render_text(self.font, f'{total}', (255, 0, 0))
+        return counter, counter.get_rect(midtop=scaled_point((width - width // 4, height // 8)))
+
+    def set_hud(self, hud):
+        self.hud = hud
+        self.renderer.invalidate()
+
+    def click(self, pos):
+        """Нажатие мыши в точке pos поверхности игры; False - игру выключили"""
+        if self.switch_sound.rect.collidepoint(pos):
+            music_switch.toggle()
+            sound_bank.play('switch.wav')
+
+        if self.push_turn.push_collidepoint(pos):
+            if not self.show_help:
+                if self.push_on[0]:
+                    return False
+                self.push_on[0] = True
+                self.push_turn.change_push(1)
+                self.sim.power_on()
+                sound_bank.play('push.wav')
+            else:
+                sound_bank.play('denied.mp3')
+        if self.push_enable.push_collidepoint(pos):
+            if self.push_on[0] and not self.show_help:
+                self.pause_state = not self.pause_state
+                self.push_enable.change_push(2 + int(self.pause_state))
+                sound_bank.play('push.wav')
             else:
-                # правая сторона
-                if 1155 >= self.rect.x > 860:
-                    #  яйцо скатывается
-                    self.rect = self.rect.move(
-                        -self.direct * self.speed_x, self.speed_y) if self.up else self.rect.move(
-                        -self.direct * self.speed_x, self.speed_y - 0.39)
-                else:
-                    #  яйцо падает отвесно
-                    self.rect = self.rect.move(0, self.speed_y * 2)
-            if self.rect.y > 609:
-                if self.rect.x < width // 2:
-                    #  разбитое яйцо слева
-                    EggBreak(points_egg_break[0], random.randint(0, 30))
-                else:
-                    #  разбитое яйцо справа
-                    EggBreak(points_egg_break[1], random.randint(0, 30))
-                self.kill()
-                pygame.event.post(pygame.event.Event(NO_CATCH))
+                sound_bank.play('denied.mp3')
+        if self.push_info.push_collidepoint(pos):
+            sound_bank.play('push.wav')
+            self.show_help = not self.show_help
+        return True
+
+    def handle(self, event, pos=None):
+        """Событие игрока (pos - положение мыши на поверхности игры); False - игру выключили"""
+        if self.player is not None:
+            # при воспроизведении команды игрока берутся из записи
+            return True
+        if event.type == pygame.MOUSEBUTTONDOWN and not self.click(pos):
+            return False
+        if not self.pause_state and event.type == pygame.KEYDOWN and event.key in self.keys:
+            self.sim.command(*self.keys[event.key])
+        return True
+
+    def update(self, elapsed):
+        """Шаги симуляции за elapsed мс реального времени"""
+        sim = self.sim
+        if self.show_help and not self.pause_state and self.push_on[0]:
+            self.pause_state = True
+            self.push_enable.change_push(3)
+        if not self.pause_state:
+            # фиксированный шаг симуляции: сложность задает длительность шага,
+            # а не частоту кадров
+            self.lag = min(self.lag + elapsed, sim.step_ms * MAX_STEPS)
+            while self.lag >= sim.step_ms and not sim.over:
+                self.lag -= sim.step_ms
+                if self.player is not None:
+                    if self.player.finished(sim):
+                        self.running = False
+                        break
+                    self.player.apply(sim)
+                sim.step()
+        if sim.powered and not self.push_on[0]:
+            # игра включена командой из записи
+            self.push_on[0] = True
+            self.push_turn.change_push(1)
+
+    def sync(self, stats=None):
+        """Спрайты отображают состояние симуляции; stats - время кадра для панели"""
+        sim = self.sim
+        if self.switch_sound.switch != music_switch.on:
+            # музыку могли переключить на другом поле
+            self.switch_sound.switch = music_switch.on
+            self.switch_sound.change_switch(int(music_switch.on))
+        if self.wolf.point != points_catch[sim.wolf]:
+            self.wolf.move(sim.wolf, points_wolf, points_catch[sim.wolf])
+        sync_eggs(self.eggs, sim.eggs, self.lag / sim.step_ms, self.all_sprites)
+        sync_sprites(self.breaks, sim.breaks, break_pool, self.all_sprites)
+        while len(self.chickens) > sim.life:
+            self.chickens.pop(0).kill()
+        if sim.level != self.level:
+            self.level = sim.level
+            self.background = self.backgrounds(self.level)
+            self.renderer.invalidate()
+        if sim.over:
+            self.running = False
+        if sim.total != self.shown_total:
+            # счет перерисовывается только при изменении
+            old_box = self.box
+            self.counter, self.box = self.score(sim.total)
+            self.changed.extend((old_box, self.box))
+            self.shown_total = sim.total
+        if (self.pause_state, self.show_help) != self.overlay_state:
+            self.renderer.invalidate()
+            self.overlay_state = (self.pause_state, self.show_help)
+        if stats is not None:
+            stats.info = {'sprites': len(self.all_sprites), 'eggs': len(self.eggs), 'breaks': len(self.breaks),
+                          'egg_frequency': sim.egg_frequency, 'delta_level': sim.delta_level}
+            if self.hud is not None:
+                area = self.hud.update(stats)
+                if area is not None:
+                    self.changed.append(area)
+
+    def draw(self, target):
+        """Отрисовка всех слоев кадра"""
+        target.blit(self.background, (0, 0))
+        target.blit(self.counter, self.box)
+        self.all_sprites.draw(target)
+        if self.pause_state:
+            pause_text = render_text(self.font, "ПАУЗА", (255, 0, 0))
+            target.blit(pause_text, (target.get_width() // 2 - pause_text.get_width() // 2,
+                                     target.get_height() // 2))
+        target.blit(self.monitor, (0, 0))
+        if self.show_help:
+            target.blit(self.help_overlay, (0, 0))
+        self.control_sprites.draw(target)
+        if self.hud is not None:
+            self.hud.draw(target)
+
+    def render(self, dirty=False):
+        """Рисует кадр; возвращает изменившиеся области (None - весь кадр)"""
+        if dirty:
+            rects = self.renderer.render(self.draw, self.changed)
         else:
-            pygame.event.post(pygame.event.Event(CATCH))
-            self.kill()
+            self.draw(self.screen)
+            rects = None
+        self.changed = []
+        return rects
+
+    def release(self):
+        """Возвращает спрайты яиц в пулы для следующих игр"""
+        for sprite in self.eggs:
+            egg_pool.release(sprite)
+        for sprite in self.breaks.values():
+            break_pool.release(sprite)
+        self.eggs, self.breaks = [], dict()
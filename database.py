@@ -0,0 +1,391 @@
+"""Хранилище пользователей и результатов игр поверх SQLite.
+
+У каждого потока (игрового и потока записи результатов) свое долгоживущее
+соединение (WAL, настроенные pragma, кэш подготовленных выражений): в режиме
+WAL чтение не ждет транзакцию записи, поэтому экраны меню не останавливаются,
+пока записывается пачка результатов.
+
+Статистика игроков не считается по game_sessions, а поддерживается при
+каждой записи результата: user_stats хранит число игр, сумму очков и
+среднее последних игр, score_tree - дерево Фенвика числа игроков
+по рекордам. Место игрока и процент игроков с меньшим рекордом - сумма
+O(log) строк дерева, без просмотра таблиц."""
+import sqlite3
+import threading
+from datetime import datetime
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS users
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        registration_date TEXT,
+        last_played TEXT,
+        highscore INTEGER DEFAULT 0)''',
+    '''CREATE TABLE IF NOT EXISTS game_sessions
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        play_date TEXT,
+        score INTEGER,
+        FOREIGN KEY(user_id) REFERENCES users(id))''',
+    'CREATE INDEX IF NOT EXISTS idx_sessions_user_date ON game_sessions(user_id, play_date)',
+    'CREATE INDEX IF NOT EXISTS idx_users_highscore ON users(highscore)',
+    '''CREATE TABLE IF NOT EXISTS user_stats
+       (user_id INTEGER PRIMARY KEY REFERENCES users(id),
+        games INTEGER NOT NULL DEFAULT 0,
+        total INTEGER NOT NULL DEFAULT 0,
+        recent REAL NOT NULL DEFAULT 0,
+        last_score INTEGER NOT NULL DEFAULT 0)''',
+    # узел дерева Фенвика -> число игроков с рекордами из его диапазона
+    'CREATE TABLE IF NOT EXISTS score_tree (node INTEGER PRIMARY KEY, users INTEGER NOT NULL)',
+)
+# версия схемы (PRAGMA user_version): с версии 1 есть таблицы статистики,
+# с версии 2 среднее последних игр - среднее RECENT_GAMES игр (при переходе статистика пересчитывается)
+SCHEMA_VERSION = 2
+# рекорды в дереве: 0 ... TREE_SIZE - 1 (большие рекорды считаются равными TREE_SIZE - 1)
+TREE_SIZE = 1 << 16
+# "последние игры" статистики: столько последних игр по (дате игры, id) - в порядке
+# индекса idx_sessions_user_date, поэтому их чтение не зависит от числа игр игрока
+RECENT_GAMES = 5
+# страничный кэш (Кб): обычный и на время импорта, когда игроки ищутся по имени в случайном порядке
+CACHE_SIZE = 8000
+IMPORT_CACHE = 65536
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = NORMAL',  # в режиме WAL надежно и без fsync на каждую транзакцию
+    f'PRAGMA cache_size = -{CACHE_SIZE}',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',
+)
+
+# запросы (подготовленные выражения кэшируются соединением)
+SELECT_USER_ID = 'SELECT id FROM users WHERE username = ?'
+SELECT_HIGHSCORE = 'SELECT highscore FROM users WHERE id = ?'
+SELECT_STATS = '''SELECT highscore, games, total, recent, last_score FROM users
+                  JOIN user_stats ON user_stats.user_id = users.id WHERE users.id = ?'''
+INSERT_STATS = 'INSERT INTO user_stats (user_id) VALUES (?)'
+# среднее и последняя игра пересчитываются по последним играм так же, как в REBUILD_STATS
+UPDATE_STATS = f'''UPDATE user_stats SET games = games + 1, total = total + :score,
+                   recent = (SELECT AVG(score) FROM
+                                 (SELECT score FROM game_sessions WHERE user_id = :user_id
+                                  ORDER BY play_date DESC, id DESC LIMIT {RECENT_GAMES})),
+                   last_score = (SELECT score FROM game_sessions WHERE user_id = :user_id
+                                 ORDER BY play_date DESC, id DESC LIMIT 1)
+                   WHERE user_id = :user_id'''
+UPDATE_TREE = '''INSERT INTO score_tree (node, users) VALUES (?, ?)
+                 ON CONFLICT(node) DO UPDATE SET users = users + excluded.users'''
+# пересчет статистики по всем играм (миграция и массовый импорт)
+REBUILD_STATS = (
+    'DELETE FROM user_stats',
+    f'''INSERT INTO user_stats (user_id, games, total, recent, last_score)
+       SELECT users.id, COALESCE(games, 0), COALESCE(total, 0), COALESCE(recent, 0), COALESCE(last_score, 0)
+       FROM users LEFT JOIN
+           (SELECT user_id, COUNT(*) AS games, SUM(score) AS total,
+                   AVG(CASE WHEN recency <= {RECENT_GAMES} THEN score END) AS recent,
+                   MAX(CASE WHEN recency = 1 THEN score END) AS last_score
+            FROM (SELECT user_id, score,
+                         ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY play_date DESC, id DESC) AS recency
+                  FROM game_sessions)
+            GROUP BY user_id) AS sessions ON sessions.user_id = users.id''',
+    'DELETE FROM score_tree',
+)
+SELECT_PAGE_STATS = '''SELECT username, highscore, games, total FROM users
+                       JOIN user_stats ON user_stats.user_id = users.id WHERE username IN ({})'''
+SELECT_HISTOGRAM = f'SELECT MIN(highscore, {TREE_SIZE - 1}), COUNT(*) FROM users GROUP BY 1'
+INSERT_USER = 'INSERT INTO users (username, registration_date, last_played) VALUES (?, ?, ?)'
+UPDATE_USER = 'UPDATE users SET last_played = ?, highscore = MAX(highscore, ?) WHERE id = ?'
+INSERT_SESSION = 'INSERT INTO game_sessions (user_id, play_date, score) VALUES (?, ?, ?)'
+# страницы таблицы рекордов: keyset-пагинация по индексу (highscore, id);
+# равные рекорды и меньшие рекорды читаются отдельными запросами, чтобы оба шли поиском по индексу
+PAGE_FIRST = 'SELECT username, highscore, id FROM users ORDER BY highscore DESC, id DESC LIMIT ?'
+PAGE_TIES_AFTER = 'SELECT username, highscore, id FROM users WHERE highscore = ? AND id < ? ORDER BY id DESC LIMIT ?'
+PAGE_AFTER = 'SELECT username, highscore, id FROM users WHERE highscore < ? ORDER BY highscore DESC, id DESC LIMIT ?'
+PAGE_TIES_BEFORE = 'SELECT username, highscore, id FROM users WHERE highscore = ? AND id > ? ORDER BY id LIMIT ?'
+PAGE_BEFORE = 'SELECT username, highscore, id FROM users WHERE highscore > ? ORDER BY highscore, id LIMIT ?'
+# поиск по началу имени: диапазон по уникальному индексу username
+SEARCH_AFTER = '''SELECT username, highscore FROM users
+                  WHERE username >= ? AND username < ? AND username > ? ORDER BY username LIMIT ?'''
+SEARCH_BEFORE = '''SELECT username, highscore FROM users
+                   WHERE username >= ? AND username < ? ORDER BY username DESC LIMIT ?'''
+# перенос базы между автоматами: игры ссылаются на игрока по имени, а не по id
+EXPORT_USERS = 'SELECT username, registration_date, last_played, highscore FROM users ORDER BY id'
+EXPORT_SESSIONS = '''SELECT username, play_date, score FROM game_sessions
+                     JOIN users ON users.id = game_sessions.user_id ORDER BY game_sessions.id'''
+# импорт сначала загружается в промежуточные таблицы (транзакциями по IMPORT_TRANSACTION строк),
+# затем переносится в основные одной транзакцией вместе с пересчетом статистики: прерванный
+# импорт не оставляет в базе ни части строк, ни устаревшей статистики
+STAGING = (
+    'CREATE TABLE import_users (username TEXT, registration_date TEXT, last_played TEXT, highscore INTEGER)',
+    'CREATE TABLE import_sessions (username TEXT, play_date TEXT, score INTEGER)',
+)
+DROP_STAGING = ('DROP TABLE IF EXISTS import_users', 'DROP TABLE IF EXISTS import_sessions')
+STAGE_ROWS = {
+    'users': 'INSERT INTO import_users VALUES (?, ?, ?, ?)',
+    'game_sessions': 'INSERT INTO import_sessions VALUES (?, ?, ?)',
+}
+# игрок, который уже есть в базе, объединяется: рекорд - больший из двух, как в save_sessions
+# (WHERE true отделяет ON CONFLICT от SELECT)
+MERGE_USERS = '''INSERT INTO users (username, registration_date, last_played, highscore)
+                 SELECT username, registration_date, last_played, highscore FROM import_users WHERE true
+                 ON CONFLICT(username) DO UPDATE SET
+                 registration_date = MIN(COALESCE(registration_date, excluded.registration_date),
+                                         COALESCE(excluded.registration_date, registration_date)),
+                 last_played = MAX(COALESCE(last_played, excluded.last_played),
+                                   COALESCE(excluded.last_played, last_played)),
+                 highscore = MAX(highscore, excluded.highscore)'''
+# игра, которая уже есть в базе (тот же игрок, дата и очки), не добавляется - повторный импорт
+# того же файла ничего не меняет; игра игрока, которого нет ни в базе, ни в файле, пропускается.
+# CROSS JOIN задает порядок: промежуточная таблица читается подряд, игроки ищутся по индексу имени
+MERGE_SESSIONS = '''INSERT INTO game_sessions (user_id, play_date, score)
+                    SELECT users.id, import_sessions.play_date, import_sessions.score
+                    FROM import_sessions CROSS JOIN users ON users.username = import_sessions.username
+                    WHERE NOT EXISTS (SELECT 1 FROM game_sessions
+                                      WHERE user_id = users.id AND play_date IS import_sessions.play_date
+                                      AND score = import_sessions.score)'''
+# строк в одной транзакции загрузки в промежуточные таблицы
+IMPORT_TRANSACTION = 1000000
+
+
+def tree_path(highscore):
+    """Узлы дерева Фенвика, в которые входит рекорд highscore"""
+    node = min(max(highscore, 0), TREE_SIZE - 1) + 1
+    while node <= TREE_SIZE:
+        yield node
+        node += node & -node
+
+
+def prefix_path(highscore):
+    """Узлы дерева, сумма которых - число игроков с рекордом не больше highscore"""
+    node = min(highscore, TREE_SIZE - 1) + 1
+    while node > 0:
+        yield node
+        node -= node & -node
+
+
+class Database:
+    """Пользователи и результаты игр; соединение открывается при первом обращении"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()  # кэш user_ids и список соединений
+        self.connections = dict()  # id потока -> соединение
+        self.user_ids = dict()  # имя пользователя -> id
+
+    def open(self):
+        """Соединение текущего потока; при открытии создается схема и пересчитывается статистика
+        старой базы"""
+        conn = self.connections.get(threading.get_ident())
+        if conn is None:
+            # закрывается и из другого потока (close), поэтому check_same_thread=False
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            with conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+                if conn.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+                    # статистика уже сыгранных игр считается один раз
+                    self._rebuild_stats(conn)
+                    conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+            with self.lock:
+                self.connections[threading.get_ident()] = conn
+        return conn
+
+    @property
+    def conn(self):
+        return self.open()
+
+    @staticmethod
+    def _rebuild_stats(conn):
+        for statement in REBUILD_STATS:
+            conn.execute(statement)
+        tree = dict()
+        for highscore, count in conn.execute(SELECT_HISTOGRAM).fetchall():
+            for node in tree_path(highscore):
+                tree[node] = tree.get(node, 0) + count
+        conn.executemany(UPDATE_TREE, tree.items())
+
+    def rebuild_stats(self):
+        """Пересчет статистики по всем играм (после изменения таблиц в обход save_sessions)"""
+        with self.conn:
+            self._rebuild_stats(self.conn)
+
+    def _move_in_tree(self, old, new):
+        """Рекорд игрока изменился с old на new (old=None - новый игрок)"""
+        changes = dict.fromkeys(tree_path(new), 1)
+        if old is not None:
+            for node in tree_path(old):
+                changes[node] = changes.get(node, 0) - 1
+        self.conn.executemany(UPDATE_TREE, ((node, count) for node, count in changes.items() if count))
+
+    def _count_up_to(self, highscore):
+        """Число игроков с рекордом не больше highscore"""
+        if highscore < 0:
+            return 0
+        nodes = tuple(prefix_path(highscore))
+        row = self.conn.execute(f'SELECT SUM(users) FROM score_tree WHERE node IN ({", ".join("?" * len(nodes))})',
+                                nodes).fetchone()
+        return row[0] or 0
+
+    def rank(self, highscore):
+        """Место игрока с рекордом highscore (равные рекорды делят место) и число игроков"""
+        players = self._count_up_to(TREE_SIZE - 1)
+        return players - self._count_up_to(highscore) + 1, players
+
+    def player_stats(self, username):
+        """Статистика игрока (словарь) или None, если игрока нет"""
+        row = self.conn.execute(SELECT_STATS, (self.user_id(username),)).fetchone()
+        if row is None:
+            return None
+        highscore, games, total, recent, last_score = row
+        rank, players = self.rank(highscore)
+        lower = self._count_up_to(highscore - 1)
+        average = total / games if games else 0
+        return {'games': games, 'average': average, 'best': highscore, 'last': last_score,
+                'recent': recent, 'trend': recent - average if games else 0,
+                'rank': rank, 'players': players, 'percentile': 100 * lower / players if players else 0}
+
+    def page_stats(self, usernames):
+        """Место, число игр и среднее игроков usernames (строк таблицы рекордов):
+        один запрос на все строки и запросы к дереву по одному на каждый рекорд"""
+        usernames = list(usernames)
+        if not usernames:
+            return dict()
+        rows = self.conn.execute(SELECT_PAGE_STATS.format(', '.join('?' * len(usernames))), usernames).fetchall()
+        players = self._count_up_to(TREE_SIZE - 1)
+        ranks = dict()  # рекорд -> место
+        result = dict()
+        for username, highscore, games, total in rows:
+            if highscore not in ranks:
+                ranks[highscore] = players - self._count_up_to(highscore) + 1
+            result[username] = {'rank': ranks[highscore], 'games': games,
+                                'average': total / games if games else 0}
+        return result
+
+    def close(self):
+        """Закрывает соединения всех потоков (вызывается, когда потоки закончили работу с базой)"""
+        with self.lock:
+            for conn in self.connections.values():
+                conn.close()
+            self.connections.clear()
+
+    def user_id(self, username):
+        """id пользователя (запрашивается из базы один раз)"""
+        with self.lock:
+            user_id = self.user_ids.get(username)
+        if user_id is None:
+            row = self.conn.execute(SELECT_USER_ID, (username,)).fetchone()
+            if row is None:
+                return None
+            user_id = row[0]
+            with self.lock:
+                self.user_ids[username] = user_id
+        return user_id
+
+    def users_page(self, limit, key=None, backward=False, prefix=''):
+        """До limit строк (имя, рекорд, ключ) после строки с ключом key (перед ней при backward=True).
+
+        Без prefix строки идут по убыванию рекорда, ключ - (рекорд, id);
+        с prefix - имена, начинающиеся с prefix, по алфавиту, ключ - (имя,)"""
+        if prefix:
+            rows = self._search_page(limit, key, backward, prefix)
+        else:
+            rows = self._leaderboard_page(limit, key, backward)
+        return rows[::-1] if backward else rows
+
+    def _leaderboard_page(self, limit, key, backward):
+        if key is None:
+            if backward:
+                return []
+            rows = self.conn.execute(PAGE_FIRST, (limit,)).fetchall()
+        else:
+            highscore, user_id = key
+            ties, other = (PAGE_TIES_BEFORE, PAGE_BEFORE) if backward else (PAGE_TIES_AFTER, PAGE_AFTER)
+            rows = self.conn.execute(ties, (highscore, user_id, limit)).fetchall()
+            if len(rows) < limit:
+                rows += self.conn.execute(other, (highscore, limit - len(rows))).fetchall()
+        return [(username, highscore, (highscore, user_id)) for username, highscore, user_id in rows]
+
+    def _search_page(self, limit, key, backward, prefix):
+        # все строки, начинающиеся с prefix, лежат в диапазоне [prefix, prefix + максимальный символ)
+        low, high = prefix, prefix + '\U0010ffff'
+        if backward:
+            if key is None:
+                return []
+            rows = self.conn.execute(SEARCH_BEFORE, (low, min(high, key[0]), limit)).fetchall()
+        else:
+            after = key[0] if key is not None else ''
+            rows = self.conn.execute(SEARCH_AFTER, (low, high, after, limit)).fetchall()
+        return [(username, highscore, (username,)) for username, highscore in rows]
+
+    def register_user(self, username):
+        """Регистрация нового пользователя"""
+        now = datetime.now().isoformat()
+        try:
+            with self.conn:
+                cursor = self.conn.execute(INSERT_USER, (username, now, now))
+                self.conn.execute(INSERT_STATS, (cursor.lastrowid,))
+                self._move_in_tree(None, 0)
+        except sqlite3.IntegrityError:
+            return False
+        with self.lock:
+            self.user_ids[username] = cursor.lastrowid
+        return True
+
+    def highscore(self, username):
+        row = self.conn.execute(SELECT_HIGHSCORE, (self.user_id(username),)).fetchone()
+        return row[0] if row else 0
+
+    def save_sessions(self, sessions):
+        """Сохранение пачки результатов (имя, очки, дата игры) в одной транзакции;
+        результат незарегистрированного игрока - ошибка (ValueError), пачка откатывается"""
+        with self.conn:
+            for username, score, play_date in sessions:
+                user_id = self.user_id(username)
+                row = self.conn.execute(SELECT_HIGHSCORE, (user_id,)).fetchone()
+                if row is None:
+                    raise ValueError(f'unknown user {username!r}')
+                self.conn.execute(UPDATE_USER, (play_date, score, user_id))
+                self.conn.execute(INSERT_SESSION, (user_id, play_date, score))
+                # статистика и дерево рекордов обновляются в той же транзакции
+                self.conn.execute(UPDATE_STATS, {'user_id': user_id, 'score': score})
+                if score > row[0]:
+                    self._move_in_tree(row[0], score)
+
+    def export_rows(self, query, batch_size=10000):
+        """Строки запроса EXPORT_USERS или EXPORT_SESSIONS; в памяти не больше batch_size строк"""
+        cursor = self.conn.execute(query)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+
+    def import_batches(self, batches):
+        """Загрузка пачек (таблица, строки): игроков - (имя, регистрация, последняя игра, рекорд),
+        игр - (имя, дата игры, очки). Строки попадают в базу и статистику разом, после загрузки
+        всех пачек. Возвращает число добавленных или обновленных строк каждой таблицы"""
+        conn = self.conn
+        conn.execute(f'PRAGMA cache_size = -{IMPORT_CACHE}')
+        try:
+            with conn:
+                for statement in DROP_STAGING + STAGING:
+                    conn.execute(statement)
+            pending = 0
+            for table, rows in batches:
+                conn.executemany(STAGE_ROWS[table], rows)
+                pending += len(rows)
+                if pending >= IMPORT_TRANSACTION:
+                    conn.commit()
+                    pending = 0
+            conn.commit()
+            with conn:
+                counts = {'users': conn.execute(MERGE_USERS).rowcount,
+                          'game_sessions': conn.execute(MERGE_SESSIONS).rowcount}
+                self._rebuild_stats(conn)
+        finally:
+            conn.rollback()
+            with conn:
+                for statement in DROP_STAGING:
+                    conn.execute(statement)
+            conn.execute(f'PRAGMA cache_size = -{CACHE_SIZE}')
+        return counts
@@ -0,0 +1,112 @@
+"""Яйца в симуляции, хранящиеся в массивах NumPy (необязательная зависимость).
+
+Все яйца сдвигаются, поворачиваются и проверяются на поимку одним
+пакетным шагом; результат совпадает с engine.EggList шаг в шаг."""
+import numpy as np
+
+from engine import EGG_SIZE, EGG_SIZES, ROT_STEP, points_egg, spawn_point, height, \
+    LEFT_EDGE, RIGHT_EDGE, RIGHT_START, FLOOR, ROTATE_TIME
+
+# размеры повернутого яйца по углам: (360, 2)
+SIZES = np.array(EGG_SIZES, dtype=np.int64)
+# поля яиц: имя -> тип
+FIELDS = {'x': np.int64, 'y': np.int64, 'w': np.int64, 'h': np.int64, 'prev_cx': np.int64, 'prev_cy': np.int64,
+          'rot': np.int64, 'direct': np.int64, 'up': np.bool_, 'tray': np.int64,
+          'elapsed': np.float64, 'speed_x': np.float64, 'speed_y': np.float64}
+
+
+class EggArray:
+    """Яйца в симуляции: по массиву на каждое поле, активны первые n строк"""
+
+    def __init__(self, capacity=64):
+        self.n = 0
+        self.capacity = capacity
+        for name, dtype in FIELDS.items():
+            setattr(self, name, np.zeros(capacity, dtype=dtype))
+
+    def __len__(self):
+        return self.n
+
+    def grow(self):
+        self.capacity *= 2
+        for name in FIELDS:
+            array = getattr(self, name)
+            grown = np.zeros(self.capacity, dtype=array.dtype)
+            grown[:self.n] = array[:self.n]
+            setattr(self, name, grown)
+
+    def spawn(self, tray, speed_x, speed_y, shift=0):
+        if self.n == self.capacity:
+            self.grow()
+        i = self.n
+        x, y = spawn_point(tray, speed_x, speed_y, shift)
+        w, h = EGG_SIZE
+        self.x[i], self.y[i], self.w[i], self.h[i] = x, y, w, h
+        self.prev_cx[i], self.prev_cy[i] = x + w // 2, y + h // 2
+        self.rot[i] = 0
+        self.direct[i] = -1 if points_egg[tray][0] == 195 else 1
+        self.up[i] = points_egg[tray][1] < height // 3
+        self.tray[i] = tray
+        self.elapsed[i] = 0
+        self.speed_x[i], self.speed_y[i] = speed_x, speed_y
+        self.n += 1
+        return i
+
+    def advance(self, point, step_ms):
+        """Шаг всех яиц; возвращает число пойманных и список (x, лоток) разбившихся"""
+        n = self.n
+        if not n:
+            return 0, []
+        x, y, w, h = self.x[:n], self.y[:n], self.w[:n], self.h[:n]
+        rot, direct = self.rot[:n], self.direct[:n]
+        self.prev_cx[:n] = cx = x + w // 2
+        self.prev_cy[:n] = cy = y + h // 2
+
+        # поворот вокруг центра
+        elapsed = self.elapsed[:n]
+        elapsed += step_ms
+        turn = elapsed > ROTATE_TIME
+        elapsed[turn] = 0
+        rot[turn] = (rot[turn] + direct[turn] * ROT_STEP) % 360
+        w[turn], h[turn] = SIZES[rot[turn], 0], SIZES[rot[turn], 1]
+        x[turn] = cx[turn] - w[turn] // 2
+        y[turn] = cy[turn] - h[turn] // 2
+
+        # поимка в точке корзины
+        caught = (x <= point[0]) & (point[0] < x + w) & (y <= point[1]) & (point[1] < y + h)
+        moving = ~caught
+
+        # скатывание по лотку или отвесное падение; дробная часть отбрасывается, как в pygame.Rect.move
+        speed_x, speed_y = self.speed_x[:n], self.speed_y[:n]
+        rolling = np.where(direct < 0, x <= LEFT_EDGE, (x <= RIGHT_START) & (x > RIGHT_EDGE))
+        dy_roll = np.trunc(np.where(self.up[:n], speed_y, speed_y - 0.39))
+        dy = np.where(rolling, dy_roll, np.trunc(speed_y * 2)).astype(np.int64)
+        dx = np.where(rolling, np.trunc(-direct * speed_x), 0).astype(np.int64)
+        x += np.where(moving, dx, 0)
+        y += np.where(moving, dy, 0)
+
+        broken = moving & (y > FLOOR)
+        misses = list(zip(x[broken].tolist(), self.tray[:n][broken].tolist()))
+        keep = ~(caught | broken)
+        if not keep.all():
+            k = int(keep.sum())
+            for name in FIELDS:
+                array = getattr(self, name)
+                array[:k] = array[:n][keep]
+            self.n = k
+        return int(caught.sum()), misses
+
+    def lowest_tray(self):
+        """Лоток самого низкого яйца (None, если яиц нет)"""
+        if not self.n:
+            return None
+        return int(self.tray[int(np.argmax(self.y[:self.n]))])
+
+    def views(self, alpha):
+        """(угол, x, y) центров яиц между прошлым и текущим шагом"""
+        n = self.n
+        cx = self.x[:n] + self.w[:n] // 2
+        cy = self.y[:n] + self.h[:n] // 2
+        x = np.rint(self.prev_cx[:n] + (cx - self.prev_cx[:n]) * alpha).astype(np.int64)
+        y = np.rint(self.prev_cy[:n] + (cy - self.prev_cy[:n]) * alpha).astype(np.int64)
+        return list(zip(self.rot[:n].tolist(), x.tolist(), y.tolist()))
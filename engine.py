@@ -0,0 +1,323 @@
+"""Правила игры без pygame и окна: яйца, лотки, волк, жизни и уровни сложности.
+
+Симуляция идет фиксированными шагами; один шаг соответствует одному кадру
+исходной игры, поэтому пути яиц и пороги совпадают с отрисовкой в pygame."""
+import random
+from math import sin, cos, fabs
+
+# логическое игровое поле (совпадает с размером окна в my_tools)
+width, height = 1400, 800
+# частота шагов симуляции на первом уровне: шаг сдвигает яйца на постоянное число пикселей
+SIM_FPS = 50
+# информация об уровнях перехода на следующий уровень
+DIFFICULT = (50, 100)
+# число попыток ("жизней")
+LIVES = 3
+# точки коллизий яйцо-корзинка
+points_catch = ((550, 451), (912, 443), (490, 615), (912, 607))
+#  точки появления выкатывающихся яиц
+points_egg = ((195, 193), (195, 385), (1155, 193), (1155, 385))
+# позиционирование разбившихся яиц
+points_egg_break = ([450, 610], [840, 610])
+# размер изображения яйца и шаг его поворота (в градусах)
+EGG_SIZE = (40, 50)
+ROT_STEP = 7
+# скорости яйца (пикселей за шаг)
+SPEED_X = 2.5
+SPEED_Y = 1.99
+# границы скатывания по лоткам и высота падения
+LEFT_EDGE, RIGHT_EDGE, RIGHT_START = 490, 860, 1155
+FLOOR = 609
+# время жизни разбитого яйца и период поворота яйца (мс)
+BREAK_TIME = 1000
+ROTATE_TIME = 10
+# яйца одной пачки в одном лотке появляются уже откатившимися на BURST_SHIFT шагов
+# друг относительно друга: они не совпадают и доходят до корзины в разные шаги
+BURST_SHIFT = 2
+# команды игрока (для записи и воспроизведения игр)
+POWER_ON, MOVE_WOLF, TOGGLE_SPAWN = range(3)
+
+
+def spawn_point(tray, speed_x=SPEED_X, speed_y=SPEED_Y, shift=0):
+    """Положение яйца, скатившегося по лотку tray на shift шагов (не дальше края лотка)"""
+    x, y = points_egg[tray]
+    direct = -1 if x == 195 else 1
+    dx = int(-direct * speed_x)
+    dy = int(speed_y if y < height // 3 else speed_y - 0.39)
+    if dx:
+        # шагов скатывания до края лотка
+        shift %= (LEFT_EDGE - x) // dx + 1 if direct < 0 else (x - RIGHT_EDGE - 1) // -dx + 1
+    return x + dx * shift, y + dy * shift
+
+
+def rotated_size(w, h, angle):
+    """Размер изображения w x h, повернутого на angle градусов (как pygame.transform.rotate)"""
+    if angle % 90 == 0:
+        return (h, w) if angle % 180 else (w, h)
+    radians = angle * .01745329251994329
+    cx, cy = cos(radians) * w, cos(radians) * h
+    sx, sy = sin(radians) * w, sin(radians) * h
+    return int(max(fabs(cx + sy), fabs(cx - sy))), int(max(fabs(sx + cy), fabs(sx - cy)))
+
+
+# размеры повернутого яйца для всех углов
+EGG_SIZES = tuple(rotated_size(*EGG_SIZE, angle) for angle in range(360))
+
+
+class EggState:
+    """Яйцо в симуляции: прямоугольник, поворот и направление движения"""
+    __slots__ = ('tray', 'x', 'y', 'w', 'h', 'up', 'direct', 'rot', 'rot_speed',
+                 'speed_x', 'speed_y', 'elapsed', 'prev_center')
+
+    def __init__(self, tray, speed_x=SPEED_X, speed_y=SPEED_Y, shift=0):
+        self.tray = tray  # номер лотка (индекс в points_egg)
+        self.x, self.y = spawn_point(tray, speed_x, speed_y, shift)
+        self.w, self.h = EGG_SIZE
+        self.up = points_egg[tray][1] < height // 3  # верхний/нижний лоток
+        self.direct = -1 if points_egg[tray][0] == 195 else 1
+        self.rot = 0
+        self.rot_speed = self.direct * ROT_STEP
+        self.speed_x = speed_x
+        self.speed_y = speed_y
+        self.elapsed = 0  # время с последнего поворота (мс)
+        self.prev_center = self.center
+
+    @property
+    def center(self):
+        return self.x + self.w // 2, self.y + self.h // 2
+
+    def rotate(self, step_ms):
+        self.elapsed += step_ms
+        if self.elapsed > ROTATE_TIME:
+            self.elapsed = 0
+            self.rot = (self.rot + self.rot_speed) % 360
+            cx, cy = self.center
+            self.w, self.h = EGG_SIZES[self.rot]
+            self.x, self.y = cx - self.w // 2, cy - self.h // 2
+
+    def collidepoint(self, point):
+        return self.x <= point[0] < self.x + self.w and self.y <= point[1] < self.y + self.h
+
+    def move(self):
+        """Сдвиг на один шаг; смещения отбрасывают дробную часть, как pygame.Rect.move"""
+        if self.direct < 0:
+            rolling = self.x <= LEFT_EDGE
+        else:
+            rolling = RIGHT_START >= self.x > RIGHT_EDGE
+        if rolling:
+            #  яйцо скатывается
+            self.x += int(-self.direct * self.speed_x)
+            self.y += int(self.speed_y if self.up else self.speed_y - 0.39)
+        else:
+            #  яйцо падает отвесно
+            self.y += int(self.speed_y * 2)
+
+
+class EggList:
+    """Яйца в симуляции: список объектов EggState, шаг считается по одному яйцу.
+
+    Тот же интерфейс у массивного хранилища egg_array.EggArray"""
+
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def spawn(self, tray, speed_x, speed_y, shift=0):
+        egg = EggState(tray, speed_x, speed_y, shift)
+        self.items.append(egg)
+        return egg
+
+    def advance(self, point, step_ms):
+        """Шаг всех яиц; возвращает число пойманных и список (x, лоток) разбившихся"""
+        caught, broken, eggs = 0, [], []
+        for egg in self.items:
+            egg.prev_center = egg.center
+            egg.rotate(step_ms)
+            if egg.collidepoint(point):
+                caught += 1
+                continue
+            egg.move()
+            if egg.y > FLOOR:
+                broken.append((egg.x, egg.tray))
+                continue
+            eggs.append(egg)
+        self.items = eggs
+        return caught, broken
+
+    def lowest_tray(self):
+        """Лоток самого низкого яйца (None, если яиц нет)"""
+        if not self.items:
+            return None
+        return max(self.items, key=lambda egg: egg.y).tray
+
+    def views(self, alpha):
+        """(угол, x, y) центров яиц между прошлым и текущим шагом"""
+        views = []
+        for egg in self.items:
+            (x0, y0), (x1, y1) = egg.prev_center, egg.center
+            views.append((egg.rot, round(x0 + (x1 - x0) * alpha), round(y0 + (y1 - y0) * alpha)))
+        return views
+
+
+class BreakState:
+    """Разбитое яйцо на земле"""
+    __slots__ = ('x', 'y', 'elapsed')
+
+    def __init__(self, pos, delta):
+        self.x = pos[0]
+        self.y = pos[1] + delta
+        self.elapsed = 0  # время существования (мс)
+
+
+class Simulation:
+    """Одна игра: шаги симуляции и команды игрока.
+
+    Все случайные решения берутся из собственного генератора с seed,
+    параметры сложности можно переопределить для подбора баланса.
+    vectorized=True считает яйца массивами NumPy (режим с сотнями яиц),
+    eggs_per_spawn - число яиц, появляющихся за раз.
+    Если log - список, команды игрока записываются в него как (шаг, команда, аргумент)"""
+
+    def __init__(self, seed=None, difficult=DIFFICULT, egg_frequency=2200, speed_x=SPEED_X, speed_y=SPEED_Y,
+                 vectorized=False, eggs_per_spawn=1):
+        self.random = random.Random(seed)
+        self.difficult = difficult
+        self.speed_x, self.speed_y = speed_x, speed_y
+        self.wolf = self.random.randint(0, 3)  # положение волка (индекс в points_catch)
+        self.eggs = EggList()
+        if vectorized:
+            # без numpy режим работает на списке яиц, только медленнее
+            try:
+                from egg_array import EggArray
+                self.eggs = EggArray()
+            except ImportError:
+                pass
+        self.eggs_per_spawn = eggs_per_spawn
+        self.breaks = []
+        self.total = 0
+        self.life = LIVES
+        self.level = 0
+        self.delta_level = 0
+        self.egg_frequency = self.old_frequency = egg_frequency
+        self.egg_timer = 0  # время с появления прошлого яйца (мс)
+        self.powered = False  # игра включена: яйца появляются в лотках
+        self.space = True
+        self.spawning = True
+        self.steps = 0
+        self.time = 0  # время симуляции (мс)
+        self.missed = None  # лоток последнего разбитого яйца
+        self.over = False
+        self.log = None
+
+    @property
+    def step_ms(self):
+        """Длительность шага в реальном времени: сложность задает скорость симуляции"""
+        return 1000 / (SIM_FPS + self.delta_level)
+
+    # команды игрока
+    def record(self, command, arg=0):
+        if self.log is not None:
+            self.log.append((self.steps, command, arg))
+
+    def command(self, command, arg=0):
+        """Команда игрока по коду (воспроизведение записи)"""
+        if command == POWER_ON:
+            self.power_on()
+        elif command == MOVE_WOLF:
+            self.move_wolf(arg)
+        elif command == TOGGLE_SPAWN:
+            self.toggle_spawn()
+
+    def power_on(self):
+        self.record(POWER_ON)
+        self.powered = True
+
+    def move_wolf(self, figure):
+        self.record(MOVE_WOLF, figure)
+        self.wolf = figure
+
+    def toggle_spawn(self):
+        self.record(TOGGLE_SPAWN)
+        self.space = not self.space
+        self.spawning = not self.space
+        self.egg_timer = 0
+
+    def check_level(self):
+        if self.level < len(self.difficult):
+            if self.total == self.difficult[self.level]:
+                self.level += 1
+                self.delta_level += 5
+                self.egg_frequency -= 700
+        else:
+            self.delta_level = 20
+            self.egg_frequency = 700
+        if self.total == 200:
+            self.delta_level = 30
+            self.egg_frequency = 600
+        elif self.total == 250:
+            self.delta_level += 30
+            self.egg_frequency = 200
+        if self.egg_frequency != self.old_frequency:
+            self.egg_timer = 0
+            self.old_frequency = self.egg_frequency
+
+    def spawn(self, tray=None, shift=0):
+        if tray is None:
+            tray = self.random.randint(0, 3)
+        return self.eggs.spawn(tray, self.speed_x, self.speed_y, shift)
+
+    def spawn_burst(self):
+        """Пачка из eggs_per_spawn яиц; следующее яйцо в том же лотке появляется
+        на BURST_SHIFT шагов дальше по лотку"""
+        shifts = [0] * len(points_egg)
+        for count in range(self.eggs_per_spawn):
+            tray = self.random.randint(0, 3)
+            self.spawn(tray, shifts[tray])
+            shifts[tray] += BURST_SHIFT
+
+    def step(self):
+        """Один шаг симуляции"""
+        if self.over:
+            return
+        self.check_level()
+        step_ms = self.step_ms
+        self.steps += 1
+        self.time += step_ms
+        self.egg_timer += step_ms
+        if self.spawning and self.egg_timer >= self.egg_frequency:
+            self.egg_timer -= self.egg_frequency
+            if self.powered:
+                self.spawn_burst()
+
+        caught, broken = self.eggs.advance(points_catch[self.wolf], step_ms)
+        self.total += caught
+        for x, tray in broken:
+            side = 0 if x < width // 2 else 1
+            self.breaks.append(BreakState(points_egg_break[side], self.random.randint(0, 30)))
+            self.miss(tray)
+
+        for egg_break in self.breaks:
+            egg_break.elapsed += step_ms
+        self.breaks = [egg_break for egg_break in self.breaks if egg_break.elapsed <= BREAK_TIME]
+
+    def miss(self, tray):
+        self.missed = tray
+        self.life -= 1
+        if self.life == 0:
+            self.over = True
+
+    def run(self, policy=None, max_steps=None):
+        """Игра без отрисовки до потери всех жизней или max_steps шагов.
+
+        policy(sim) вызывается перед каждым шагом и может отдавать команды"""
+        self.power_on()
+        while not self.over and (max_steps is None or self.steps < max_steps):
+            if policy is not None:
+                policy(self)
+            self.step()
+        return self.total
@@ -1,19 +1,48 @@
-from os import path
-import pygame
+import argparse
+import os
 import random
-import sqlite3
-from datetime import datetime
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pygame
 
-from my_tools import load_image, snd_dir, size, width, height
-from classes import Wolf, Egg, Chicken, Switch, Push
-from classes import EGG, CATCH, NO_CATCH
-from classes import FONT, DIFFICULT, LEVELS
-from classes import points_chicken, points_push, points_egg, \
-    points_switch, points_wolf, points_catch
-from classes import all_sprites, control_sprites
+from my_tools import get_font, render_text, size, width, height
+from assets import load_asset, manager
+from classes import FONT, LEVELS
+from classes import Game, KEYS, SEAT_KEYS, music_switch
+from engine import Simulation
+from persistence import ResultWriter
+from perf import FrameStats, PerfHud
+from profiler import profiling
+from replay import Replayer, record_game
+from transfer import export_data, import_data
+from sounds import sound_bank
+from view import view, scaled, scaled_point
+from database import Database
 
 DB_FILE = 'game_users.sqlite'
-FPS = 50
+# ограничение частоты отрисовки игры (частота обновления дисплея);
+# скорость игры задается частотой шагов симуляции, а не кадров
+RENDER_FPS = 60
+# вывод только изменившихся областей кадра вместо полной перерисовки
+DIRTY_RENDER = False
+# режим "хаос": сотни яиц одновременно, яйца считаются массивами NumPy
+CHAOS_MODE = False
+CHAOS_EGGS = 100  # яиц за одно появление в режиме "хаос"
+# панель производительности (переключается клавишей PERF_HUD_KEY) и выгрузка гистограмм
+# времени кадра в файл или udp://host:port (переменная окружения PERF_EXPORT)
+PERF_HUD = False
+PERF_HUD_KEY = pygame.K_F3
+PERF_EXPORT = os.environ.get('PERF_EXPORT')
+# выборочный профилировщик: файл collapsed stacks (переменная окружения PROFILE или ключ --profile)
+PROFILE = os.environ.get('PROFILE')
+PROFILE_INTERVAL = 0.01  # секунд между снимками стека
+# запись игр (seed и команды игрока) для воспроизведения в replay.py: включается переменной
+# окружения RECORD_GAMES=1 или ключом --record; хранятся последние replay.MAX_RECORDS записей
+RECORD_GAMES = os.environ.get('RECORD_GAMES') == '1'
+# экраны меню ждут событий не дольше IDLE_TIMEOUT мс и перерисовываются только при изменениях
+IDLE_TIMEOUT = 500
+# события окна, после которых экран меню выводится заново целиком
+EXPOSE_EVENTS = {pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED, pygame.WINDOWRESTORED, pygame.WINDOWSHOWN}
 # Цветовая схема
 COLORS = {
     'bg': (240, 240, 245),
@@ -28,91 +57,107 @@ COLORS = {
     'error': (200, 50, 50),
     'hint': (120, 120, 140)
 }
+# размеры фона уровня (первый уровень показывается крупнее) и лотков
+LEVEL_SIZES = ((width - width // 5, height - height // 7), (width - width // 4, height - height // 6))
+TRAYS_SIZE = (width + 2, height + 1)
+# собранный фон меню хранится в LRU-кэше менеджера изображений (assets.manager);
+# собранные фоны уровней текущего масштаба нужны всю игру и в LRU-кэш не попадают:
+# (уровень, масштаб) -> Future с фоном
+_level_backgrounds = dict()
+# фоновая подготовка изображений, пока игрок в меню или на текущем уровне
+_loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='asset-loader')
+_help_overlays = dict()
+# пользователи и результаты: у экранов и у потока записи результатов свои соединения с базой
+db = Database(DB_FILE)
+# результаты игр записываются в фоновом потоке (своим соединением), не задерживая интерфейс
+results_writer = ResultWriter(db.save_sessions)
 
 
 def init_db():
     """Инициализация базы данных SQLite"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    c.execute('''CREATE TABLE IF NOT EXISTS users
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  username TEXT UNIQUE,
-                  registration_date TEXT,
-                  last_played TEXT,
-                  highscore INTEGER DEFAULT 0)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS game_sessions
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                  user_id INTEGER,
-                  play_date TEXT,
-                  score INTEGER,
-                  FOREIGN KEY(user_id) REFERENCES users(id))''')
-
-    conn.commit()
-    conn.close()
-
-
-def get_all_users():
-    """Получение списка всех пользователей"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT username, highscore FROM users ORDER BY highscore DESC")
-    users = c.fetchall()
-    conn.close()
-    return users
-
-
-def register_user(username):
-    """Регистрация нового пользователя"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    try:
-        now = datetime.now().isoformat()
-        c.execute("INSERT INTO users (username, registration_date, last_played) VALUES (?, ?, ?)",
-                  (username, now, now))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
-    finally:
-        conn.close()
-
-
-def update_user_stats(username, score):
-    """Обновление статистики пользователя"""
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-
-    try:
-        now = datetime.now().isoformat()
-
-        c.execute('''UPDATE users 
-                     SET last_played = ?,
-                         highscore = MAX(highscore, ?)
-                     WHERE username = ?''',
-                  (now, score, username))
-
-        c.execute("SELECT id FROM users WHERE username = ?", (username,))
-        user_id = c.fetchone()[0]
-
-        c.execute("INSERT INTO game_sessions (user_id, play_date, score) VALUES (?, ?, ?)",
-                  (user_id, now, score))
-
-        conn.commit()
-    finally:
-        conn.close()
+    db.open()
+
+
+def wait_events(timeout=IDLE_TIMEOUT):
+    """События экрана меню: первое ожидается без нагрузки на процессор не дольше timeout мс,
+    остальные забираются из очереди (по истечении timeout - пустой список)"""
+    event = pygame.event.wait(timeout)
+    if event.type == pygame.NOEVENT:
+        return []
+    return [event] + pygame.event.get()
+
+
+class UserList:
+    """Прокручиваемый список игроков: из базы читаются только видимые строки"""
+
+    def __init__(self, rows, font):
+        self.rows = rows  # число видимых строк
+        self.font = font
+        self.prefix = ''  # начало имени для поиска
+        self.stats = dict()  # имя -> место, игры и среднее (None - нет статистики); только видимые строки
+        self.reload()
+
+    def reload(self):
+        self.page = db.users_page(self.rows, prefix=self.prefix)
+        self.stats.clear()
+        self.load_stats()
+        self.selected = 0 if self.page else -1
+
+    def load_stats(self):
+        """Статистика строк, появившихся на странице (одним запросом); ушедшие строки забываются"""
+        names = [username for username, highscore, key in self.page]
+        missing = [username for username in names if username not in self.stats]
+        if missing:
+            found = db.page_stats(missing)
+            self.stats.update((username, found.get(username)) for username in missing)
+        self.stats = {username: self.stats[username] for username in names}
+
+    @property
+    def username(self):
+        return self.page[self.selected][0] if self.selected >= 0 else None
+
+    def search(self, prefix):
+        self.prefix = prefix
+        self.reload()
+
+    def scroll(self, delta):
+        """Сдвиг выбора на delta строк; за край окна строки подгружаются по ключу крайней строки"""
+        if not self.page:
+            return
+        target = self.selected + delta
+        if target < 0:
+            rows = db.users_page(-target, self.page[0][2], backward=True, prefix=self.prefix)
+            self.page = (rows + self.page)[:self.rows]
+            self.selected = max(0, target + len(rows))
+        elif target >= len(self.page):
+            rows = db.users_page(target - len(self.page) + 1, self.page[-1][2], prefix=self.prefix)
+            combined = self.page + rows
+            drop = max(0, len(combined) - self.rows)
+            self.page = combined[drop:]
+            self.selected = min(target, len(combined) - 1) - drop
+        else:
+            self.selected = target
+            return
+        self.load_stats()
+
+    def draw(self, screen, center_x, top):
+        for i, (username, highscore, key) in enumerate(self.page):
+            color = COLORS['accent'] if i == self.selected else COLORS['text']
+            stats = self.stats[username]
+            if stats:
+                line = (f"{stats['rank']}. {username} (рекорд: {highscore}, игр: {stats['games']}, "
+                        f"в среднем: {stats['average']:.0f})")
+            else:
+                line = f"{username} (рекорд: {highscore})"
+            user_text = render_text(self.font, line, color)
+            screen.blit(user_text, (center_x - user_text.get_width() // 2, top + i * 40))
 
 
 def show_user_selection_screen(screen):
     """Отображение экрана выбора пользователя"""
-    users = get_all_users()
-    selected_index = 0 if users else -1
-    font = pygame.font.Font(None, 36)
-    title_font = pygame.font.Font(None, 48)
-    button_font = pygame.font.Font(None, 32)
-    clock = pygame.time.Clock()
+    font = get_font(36)
+    title_font = get_font(48)
+    button_font = get_font(32)
     monitor_rect = draw_monitor_surface(screen)
     offset_x, offset_y = monitor_rect.x, monitor_rect.y
     inner_width, inner_height = monitor_rect.width, monitor_rect.height
@@ -120,68 +165,91 @@ def show_user_selection_screen(screen):
                                 offset_y + inner_height - 150, 300, 50)
     start_rect = pygame.Rect(offset_x + inner_width // 2 - 150,
                              offset_y + inner_height - 80, 300, 50)
+    # область списка игроков: строки за ее пределами не рисуются и не читаются из базы
+    list_rect = pygame.Rect(offset_x, offset_y + 150, inner_width, new_user_rect.y - 10 - (offset_y + 150))
+    users = UserList(list_rect.height // 40, font)
+    shown = None  # состояние, выведенное на экран
+    full = True  # вывести весь экран, а не только область монитора
 
     while True:
-        mouse_pos = pygame.mouse.get_pos()
-
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 return None
+            if event.type in EXPOSE_EVENTS:
+                full = True
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if new_user_rect.collidepoint(mouse_pos):
+                # точка нажатия из события: положение мыши до ожидания событий уже устарело
+                pos = view.to_surface(event.pos, screen)
+                if new_user_rect.collidepoint(pos):
                     username = show_registration_screen(screen)
                     if username:
                         return username
-                    users = get_all_users()
-                    selected_index = 0 if users else -1
-                    draw_monitor_surface(screen)
+                    users.reload()
+                    full = True
 
-                elif start_rect.collidepoint(mouse_pos) and selected_index >= 0:
-                    return users[selected_index][0]
+                elif start_rect.collidepoint(pos) and users.username:
+                    return users.username
+            if event.type == pygame.MOUSEWHEEL:
+                users.scroll(-event.y)
 
             if event.type == pygame.KEYDOWN:
-                if event.key == pygame.K_UP and selected_index > 0:
-                    selected_index -= 1
-                elif event.key == pygame.K_DOWN and selected_index < len(users) - 1:
-                    selected_index += 1
-                elif event.key == pygame.K_RETURN and selected_index >= 0:
-                    return users[selected_index][0]
+                if event.key == pygame.K_UP:
+                    users.scroll(-1)
+                elif event.key == pygame.K_DOWN:
+                    users.scroll(1)
+                elif event.key == pygame.K_PAGEUP:
+                    users.scroll(-users.rows)
+                elif event.key == pygame.K_PAGEDOWN:
+                    users.scroll(users.rows)
+                elif event.key == pygame.K_RETURN and users.username:
+                    return users.username
+                elif event.key == pygame.K_BACKSPACE and users.prefix:
+                    users.search(users.prefix[:-1])
+                elif event.unicode.isprintable() and event.unicode.strip():
+                    # поиск по началу имени
+                    users.search(users.prefix + event.unicode)
+        state = (users.prefix, tuple(users.page), users.selected)
+        if state == shown and not full:
+            continue
         draw_monitor_surface(screen)
-        title = title_font.render("Выберите игрока", True, COLORS['text'])
+        title = render_text(title_font, "Выберите игрока", COLORS['text'])
         screen.blit(title, (offset_x + inner_width // 2 - title.get_width() // 2,
                             offset_y + 50))
-        if not users:
-            no_users = font.render("Нет зарегистрированных пользователей", True, COLORS['text'])
+        if users.prefix:
+            search_text = render_text(font, f"Поиск: {users.prefix}", COLORS['hint'])
+            screen.blit(search_text, (offset_x + inner_width // 2 - search_text.get_width() // 2,
+                                      offset_y + 100))
+        if not users.page:
+            message = "Ничего не найдено" if users.prefix else "Нет зарегистрированных пользователей"
+            no_users = render_text(font, message, COLORS['text'])
             screen.blit(no_users, (offset_x + inner_width // 2 - no_users.get_width() // 2,
                                    offset_y + inner_height // 3))
         else:
-            for i, (user, highscore) in enumerate(users):
-                color = COLORS['accent'] if i == selected_index else COLORS['text']
-                user_text = font.render(f"{user} (рекорд: {highscore})", True, color)
-                screen.blit(user_text, (offset_x + inner_width // 2 - user_text.get_width() // 2,
-                                        offset_y + 150 + i * 40))
+            screen.set_clip(list_rect)
+            users.draw(screen, offset_x + inner_width // 2, list_rect.y)
+            screen.set_clip(None)
         pygame.draw.rect(screen, COLORS['button'], new_user_rect)
-        new_user_text = button_font.render("Новый игрок", True, COLORS['button_text'])
+        new_user_text = render_text(button_font, "Новый игрок", COLORS['button_text'])
         screen.blit(new_user_text, (new_user_rect.x + new_user_rect.w // 2 - new_user_text.get_width() // 2,
                                     new_user_rect.y + new_user_rect.h // 2 - new_user_text.get_height() // 2))
 
-        if selected_index >= 0:
+        if users.username:
             pygame.draw.rect(screen, COLORS['success'], start_rect)
-            start_text = button_font.render("Начать игру", True, COLORS['button_text'])
+            start_text = render_text(button_font, "Начать игру", COLORS['button_text'])
             screen.blit(start_text, (start_rect.x + start_rect.w // 2 - start_text.get_width() // 2,
                                      start_rect.y + start_rect.h // 2 - start_text.get_height() // 2))
 
-        pygame.display.flip()
-        clock.tick(30)
+        # рамка монитора не меняется: после первого вывода обновляется только область монитора
+        view.present(screen, None if full else [monitor_rect])
+        shown, full = state, False
 
 
 def show_registration_screen(screen):
     """Отображение экрана регистрации"""
     input_active = True
     username = ""
-    font = pygame.font.Font(None, 36)
-    title_font = pygame.font.Font(None, 48)
-    clock = pygame.time.Clock()
+    font = get_font(36)
+    title_font = get_font(48)
     error_message = ""
     monitor_rect = draw_monitor_surface(screen)
     offset_x, offset_y = monitor_rect.x, monitor_rect.y
@@ -191,12 +259,16 @@ def show_registration_screen(screen):
     color_inactive = pygame.Color(*COLORS['button']).lerp((255, 255, 255), 0.7)
     color_active = pygame.Color(*COLORS['button'])
     color = color_inactive
+    shown = None  # состояние, выведенное на экран
+    full = True  # вывести весь экран, а не только область монитора
     while True:
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 return None
+            if event.type in EXPOSE_EVENTS:
+                full = True
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if input_box.collidepoint(event.pos):
+                if input_box.collidepoint(view.to_surface(event.pos, screen)):
                     input_active = True
                 else:
                     input_active = False
@@ -205,7 +277,7 @@ def show_registration_screen(screen):
                 if input_active:
                     if event.key == pygame.K_RETURN:
                         if username.strip():
-                            if register_user(username):
+                            if db.register_user(username):
                                 return username
                             else:
                                 error_message = "Пользователь уже существует"
@@ -216,44 +288,41 @@ def show_registration_screen(screen):
                         username += event.unicode
                         error_message = ""
 
+        state = (username, color, error_message)
+        if state == shown and not full:
+            continue
         draw_monitor_surface(screen)
-        title = title_font.render("Регистрация нового игрока", True, COLORS['text'])
+        title = render_text(title_font, "Регистрация нового игрока", COLORS['text'])
         screen.blit(title, (offset_x + inner_width // 2 - title.get_width() // 2,
                             offset_y + inner_height // 3))
-        txt_surface = font.render("Введите имя:", True, COLORS['text'])
+        txt_surface = render_text(font, "Введите имя:", COLORS['text'])
         screen.blit(txt_surface, (offset_x + inner_width // 2 - 150,
                                   offset_y + inner_height // 2 - 40))
 
         pygame.draw.rect(screen, color, input_box, 2)
-        txt_surface = font.render(username, True, COLORS['text'])
+        txt_surface = render_text(font, username, COLORS['text'])
         screen.blit(txt_surface, (input_box.x + 10, input_box.y + 10))
         input_box.w = max(300, txt_surface.get_width() + 20)
 
         if error_message:
-            error_text = font.render(error_message, True, COLORS['error'])
+            error_text = render_text(font, error_message, COLORS['error'])
             screen.blit(error_text, (offset_x + inner_width // 2 - error_text.get_width() // 2,
                                      offset_y + inner_height // 2 + 50))
 
-        hint = font.render("Нажмите Enter для подтверждения", True, COLORS['hint'])
+        hint = render_text(font, "Нажмите Enter для подтверждения", COLORS['hint'])
         screen.blit(hint, (offset_x + inner_width // 2 - hint.get_width() // 2,
                            offset_y + inner_height - 100))
 
-        pygame.display.flip()
-        clock.tick(30)
+        view.present(screen, None if full else [monitor_rect])
+        shown, full = state, False
 
 
 def show_results_screen(screen, username, score):
     """Отображение экрана с результатами игры с кликабельными кнопками"""
-    font_large = pygame.font.Font(None, 72)
-    font_medium = pygame.font.Font(None, 48)
-    font_small = pygame.font.Font(None, 36)
-
-    # Получаем рекорд пользователя
-    conn = sqlite3.connect(DB_FILE)
-    c = conn.cursor()
-    c.execute("SELECT highscore FROM users WHERE username = ?", (username,))
-    highscore = c.fetchone()[0]
-    conn.close()
+    font_large = get_font(72)
+    font_medium = get_font(48)
+    font_small = get_font(36)
+
     monitor_rect = draw_monitor_surface(screen)
     offset_x, offset_y = monitor_rect.x, monitor_rect.y
     inner_width, inner_height = monitor_rect.width, monitor_rect.height
@@ -261,292 +330,374 @@ def show_results_screen(screen, username, score):
                                 offset_y + inner_height - 150, 300, 50)
     menu_rect = pygame.Rect(offset_x + inner_width // 2 - 150,
                             offset_y + inner_height - 80, 300, 50)
+    new_game_text = render_text(font_small, "Новая игра (Enter)", COLORS['button_text'])
+    menu_text = render_text(font_small, "В меню (Q)", COLORS['button_text'])
 
-    clock = pygame.time.Clock()
-    while True:
-        mouse_pos = pygame.mouse.get_pos()
-        new_game_hover = new_game_rect.collidepoint(mouse_pos)
-        menu_hover = menu_rect.collidepoint(mouse_pos)
+    def draw_buttons(new_game_hover, menu_hover):
+        pygame.draw.rect(screen,
+                         COLORS['success_hover'] if new_game_hover else COLORS['success'],
+                         new_game_rect)
+        pygame.draw.rect(screen,
+                         COLORS['warning_hover'] if menu_hover else COLORS['warning'],
+                         menu_rect)
+        screen.blit(new_game_text, (new_game_rect.x + new_game_rect.w // 2 - new_game_text.get_width() // 2,
+                                    new_game_rect.y + new_game_rect.h // 2 - new_game_text.get_height() // 2))
+        screen.blit(menu_text, (menu_rect.x + menu_rect.w // 2 - menu_text.get_width() // 2,
+                                menu_rect.y + menu_rect.h // 2 - menu_text.get_height() // 2))
 
-        for event in pygame.event.get():
+    shown = None  # подсветка кнопок, выведенная на экран
+    full = True  # нарисовать и вывести весь экран
+    stats = None  # статистика игрока, выведенная на экран
+    while True:
+        # результат текущей игры записывается в фоне: статистика перечитывается, пока не изменится
+        # (запрос - несколько строк по ключу, его можно делать на каждом пробуждении)
+        current = db.player_stats(username)
+        if current != stats:
+            stats, full = current, True
+        for event in wait_events():
             if event.type == pygame.QUIT:
                 return False
+            if event.type in EXPOSE_EVENTS:
+                full = True
             if event.type == pygame.MOUSEBUTTONDOWN:
-                if new_game_rect.collidepoint(event.pos):
+                pos = view.to_surface(event.pos, screen)
+                if new_game_rect.collidepoint(pos):
                     return "restart"
-                elif menu_rect.collidepoint(event.pos):
+                elif menu_rect.collidepoint(pos):
                     return "menu"
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_RETURN:
                     return "restart"
                 elif event.key in (pygame.K_q, 1081):
                     return "menu"
+        mouse_pos = view.mouse_pos(screen)
+        hover = (new_game_rect.collidepoint(mouse_pos), menu_rect.collidepoint(mouse_pos))
+        if not full:
+            # при наведении мыши перерисовываются и выводятся только кнопки
+            if hover != shown:
+                draw_buttons(*hover)
+                view.present(screen, [new_game_rect, menu_rect])
+                shown = hover
+            continue
         draw_monitor_surface(screen)
 
         # Результаты игры
-        result_text = font_large.render(f"Игрок: {username}", True, COLORS['text'])
+        result_text = render_text(font_large, f"Игрок: {username}", COLORS['text'])
         screen.blit(result_text, (offset_x + inner_width // 2 - result_text.get_width() // 2,
                                   offset_y + inner_height // 3 - 50))
 
-        score_text = font_medium.render(f"Ваш результат: {score}", True, COLORS['text'])
+        score_text = render_text(font_medium, f"Ваш результат: {score}", COLORS['text'])
         screen.blit(score_text, (offset_x + inner_width // 2 - score_text.get_width() // 2,
                                  offset_y + inner_height // 3 + 50))
 
-        highscore_text = font_medium.render(f"Ваш рекорд: {highscore}", True, COLORS['accent'])
+        # результат текущей игры мог еще не дойти до базы
+        highscore = max(stats['best'] if stats else 0, score or 0)
+        highscore_text = render_text(font_medium, f"Ваш рекорд: {highscore}", COLORS['accent'])
         screen.blit(highscore_text, (offset_x + inner_width // 2 - highscore_text.get_width() // 2,
                                      offset_y + inner_height // 3 + 120))
-        pygame.draw.rect(screen,
-                         COLORS['success_hover'] if new_game_hover else COLORS['success'],
-                         new_game_rect)
-        pygame.draw.rect(screen,
-                         COLORS['warning_hover'] if menu_hover else COLORS['warning'],
-                         menu_rect)
-        new_game_text = font_small.render("Новая игра (Enter)", True, COLORS['button_text'])
-        screen.blit(new_game_text, (new_game_rect.x + new_game_rect.w // 2 - new_game_text.get_width() // 2,
-                                    new_game_rect.y + new_game_rect.h // 2 - new_game_text.get_height() // 2))
-        menu_text = font_small.render("В меню (Q)", True, COLORS['button_text'])
-        screen.blit(menu_text, (menu_rect.x + menu_rect.w // 2 - menu_text.get_width() // 2,
-                                menu_rect.y + menu_rect.h // 2 - menu_text.get_height() // 2))
 
-        pygame.display.flip()
-        clock.tick(30)
+        if stats and stats['games']:
+            lines = (f"Игр: {stats['games']}, в среднем: {stats['average']:.0f}, "
+                     f"последние игры: {stats['trend']:+.0f}",
+                     f"Место: {stats['rank']} из {stats['players']}, "
+                     f"лучше {stats['percentile']:.0f}% игроков")
+            for i, line in enumerate(lines):
+                stats_text = render_text(font_small, line, COLORS['text'])
+                screen.blit(stats_text, (offset_x + inner_width // 2 - stats_text.get_width() // 2,
+                                         offset_y + inner_height // 3 + 180 + i * 40))
+        draw_buttons(*hover)
+        view.present(screen)
+        shown, full = hover, False
+
+
+def get_monitor_frame(size_):
+    """Рамка монитора, масштабированная под размер окна"""
+    return load_asset('screen__.png', size_, -1)
+
+
+def get_help_overlay(size_):
+    """Затемнение с подсказкой по управлению (собирается один раз на размер поверхности)"""
+    if size_ not in _help_overlays:
+        w, h = size_
+        scale = w / width
+        help_surface = pygame.Surface(size_, pygame.SRCALPHA)
+        help_surface.fill((0, 0, 0, 180))
+
+        # Создаем текст подсказки
+        font = get_font(scaled(36, scale))
+        lines = [
+            "Управление в игре:",
+            "",
+            "Клавиши END/HOME - движение волка влево/вправо",
+            "Клавиши UP/DOWN - движение волка вверх/вниз",
+            "Клавиша SPACE - пауза",
+            "Кнопка звука - включение/выключение звука",
+            "Кнопка паузы - поставить игру на паузу",
+            "",
+            "Нажмите кнопку информации еще раз, чтобы закрыть"
+        ]
+        for i, line in enumerate(lines):
+            text = font.render(line, True, (255, 255, 255))
+            help_surface.blit(text, (w // 2 - text.get_width() // 2,
+                                     h // 2 + scaled(-100 + i * 40, scale)))
+        _help_overlays[size_] = help_surface
+    return _help_overlays[size_]
 
 
 def draw_monitor_surface(screen, bg_color=(240, 240, 245)):
     """Отрисовывает поверхность монитора с рамкой и заданным цветом фона"""
-    monitor_bg = pygame.Surface((width - width // 5, height - height // 5), pygame.SRCALPHA)
-    monitor_bg.fill(bg_color)
-    x_pos = width // 10
-    y_pos = height // 10
-    screen.blit(monitor_bg, (x_pos, y_pos))
-    monitor_frame = load_image('screen__.png', -1)
-    monitor_frame = pygame.transform.scale(monitor_frame, size)
-    screen.blit(monitor_frame, (0, 0))
-
-    return pygame.Rect(x_pos, y_pos, width - width // 5, height - height // 5)
-
-
-def run_game(screen, username):
-    """Основной игровой цикл"""
-    global switch_on, push_on, pause_state
-
-    # Задаём начальное состояние
-    switch_on = False
-    push_on = [False, False]
-    pause_state = False
-    show_help = False
-    all_sprites.empty()
-    control_sprites.empty()
-    delta_level = 0
-    egg_frequency = old_frequency = 2200
-    level_music = 0.4
-    wolf = Wolf(random.randint(0, 3), points_wolf)
-    chickens = [Chicken(points_chicken[count]) for count in range(3)]
-
-    switch_sound = Switch(0, switch_on, points_switch)
-    push_turn = Push(0, push_on[0], points_push[0])  # Кнопка включения
-    push_enable = Push(2, push_on[1], points_push[1])  # Кнопка паузы
-    push_info = Push(4, False, points_push[2])  # Кнопка настроек
-
-    surface_bg = pygame.Surface((width - width // 4, height - height // 6))
-    surface_bg.fill((255, 255, 255))
+    w, h = screen.get_size()
+    inner_rect = pygame.Rect(w // 10, h // 10, w - w // 5, h - h // 5)
 
-    levels_images = [pygame.transform.scale(
-        load_image(LEVELS[count + 1], -1), (width - width // 5, height - height // 7)) for count in range(3)]
-    level = levels_images[0]
+    def build():
+        # фон и рамка собираются в одну поверхность
+        background = pygame.Surface((w, h))
+        background.fill(bg_color, inner_rect)
+        background.blit(get_monitor_frame((w, h)), (0, 0))
+        return background.convert()
 
-    monitor = load_image('screen__.png', -1)
-    monitor = pygame.transform.scale(monitor, size)
+    screen.blit(manager.cached(('menu', (w, h), tuple(bg_color)), build), (0, 0))
+    return inner_rect
 
-    trays = load_image('lots__.png', -1)
-    trays = pygame.transform.scale(trays, (width + 2, height + 1))
 
-    # Инициализация звуков
-    switch_sound_ = pygame.mixer.Sound(path.join(snd_dir, 'switch.wav'))
-    push_sound = pygame.mixer.Sound(path.join(snd_dir, 'push.wav'))
-    denied_sound = pygame.mixer.Sound(path.join(snd_dir, 'denied.mp3'))
+def load_level(level, size_, keep=True):
+    """Фон уровня level (считая с нуля) размера size_"""
+    return load_asset(LEVELS[level + 1], size_, -1, keep)
+
+
+def preload_assets():
+    """Запрашивает все изображения экранов игры (по этому списку собирается пакет ресурсов)"""
+    for level in range(len(LEVELS)):
+        compose_level(level)
+    get_monitor_frame(size)
+    load_asset('old_gadget.JPG', 1.5)
+
+
+def compose_level(level, scale=1):
+    """Фон уровня level вместе с лотками в масштабе scale; первый уровень показывается крупнее.
+
+    Исходные слои не остаются в кэше изображений и не вытесняют из него другие фоны"""
+    size_ = LEVEL_SIZES[0] if level == 0 else LEVEL_SIZES[1]
+    return compose_background(load_level(level, scaled_point(size_, scale), keep=False),
+                              load_asset('lots__.png', scaled_point(TRAYS_SIZE, scale), -1, keep=False), scale)
 
-    clock = pygame.time.Clock()
-    pygame.time.set_timer(EGG, egg_frequency)
-    space = True
-    total = 0
-    current_level = 0
-    life = 3
 
-    running = True
+def preload_level_backgrounds():
+    """Запускает сборку фонов всех уровней (в масштабе игрового поля) в фоновом потоке;
+    фоны прежнего масштаба освобождаются"""
+    for key in list(_level_backgrounds):
+        if key[1] != view.render_scale:
+            del _level_backgrounds[key]
+    for level in range(len(LEVELS)):
+        key = (level, view.render_scale)
+        if key not in _level_backgrounds:
+            _level_backgrounds[key] = _loader.submit(compose_level, *key)
 
-    pygame.mixer.music.load(path.join(snd_dir, 'wolf_catches_eggs1.mp3'))
-    pygame.mixer.music.play(loops=-1)
-    pygame.mixer.music.set_volume(0)
+
+def level_background(level):
+    """Собранный фон уровня (ждет фоновую сборку, только если она еще не закончилась)"""
+    preload_level_backgrounds()
+    return _level_backgrounds[level, view.render_scale].result()
+
+
+def compose_background(level, trays, scale=1):
+    """Неподвижные слои игрового экрана: фон уровня и лотки"""
+    surface_bg = pygame.Surface(scaled_point((width - width // 4, height - height // 6), scale))
+    surface_bg.fill((255, 255, 255))
+    surface_bg.blit(level, (0, 0))
+    background = pygame.Surface(scaled_point(size, scale))
+    background.blit(surface_bg, scaled_point((160, 60), scale))
+    background.blit(trays, (scaled(-1, scale), 0))
+    return background.convert()
+
+
+def new_game(screen, chaos=CHAOS_MODE, replay=None, sim=None, keys=KEYS):
+    """Игра на поверхности screen; возвращает игру, seed и правила (для записи)"""
+    # правила игры считает симуляция, здесь только отрисовка и управление
+    if replay is None:
+        seed = random.randrange(2 ** 63)
+        rules = {'vectorized': chaos, 'eggs_per_spawn': CHAOS_EGGS if chaos else 1}
+    else:
+        seed, rules = replay['seed'], replay['rules']
+    if sim is None:
+        sim = Simulation(seed, **rules)
+        if RECORD_GAMES and replay is None:
+            sim.log = []
+    player = Replayer(replay, sim.steps) if replay is not None else None
+    # неподвижные слои (фон уровня и лотки) собраны в одну поверхность заранее для каждого уровня
+    game = Game(screen, sim, level_background, get_monitor_frame(screen.get_size()),
+                get_help_overlay(screen.get_size()), player, keys)
+    return game, seed, rules
+
+
+def toggle_hud(game):
+    """Панель производительности на поле игры: показывает время кадров всего окна"""
+    game.set_hud(None if game.hud is not None else PerfHud(scaled_point((170, 70))))
+
+
+def end_game(game, username, seed, rules):
+    """Спрайты игры возвращаются в пулы, игра записывается, результат сохраняется"""
+    game.release()
+    if game.sim.log is not None:
+        record_game(game.sim, seed, rules)
+    if game.player is None:
+        results_writer.put(username, game.sim.total)
+
+
+def run_game(screen, username, dirty=DIRTY_RENDER, chaos=CHAOS_MODE, replay=None, fast=False, sim=None):
+    """Основной игровой цикл
+
+    screen - поверхность игрового поля (логический размер в масштабе view.render_scale).
+    При dirty=True на экран выводятся только изменившиеся области кадра,
+    при chaos=True яйца появляются пачками по CHAOS_EGGS (сотни яиц одновременно).
+    replay - запись игры (replay.load_log): команды берутся из нее, а не от игрока;
+    при fast=True каждый кадр выполняет один шаг симуляции без ожидания;
+    sim - готовая симуляция вместо новой (например, прокрученная до нужного уровня)"""
+    game, seed, rules = new_game(screen, chaos, replay, sim)
+    if PERF_HUD:
+        toggle_hud(game)
+    stats = FrameStats(export=PERF_EXPORT)
+    clock = pygame.time.Clock()
+
+    sound_bank.play_music('wolf_catches_eggs1.mp3', music_switch.volume())
 
     try:
-        while running:
-            clock.tick(FPS + delta_level)
-            if not pause_state:
-                if current_level < len(DIFFICULT):
-                    if total == DIFFICULT[current_level]:
-                        level = pygame.transform.scale(levels_images[current_level + 1],
-                                                       (width - width // 4, height - height // 6))
-                        current_level += 1
-                        delta_level += 5
-                        egg_frequency -= 700
-                else:
-                    delta_level = 20
-                    egg_frequency = 700
-            if total == 200:
-                delta_level = 30
-                egg_frequency = 600
-            elif total == 250:
-                delta_level += 30
-                egg_frequency = 200
-            if egg_frequency != old_frequency:
-                pygame.time.set_timer(EGG, egg_frequency)
-                old_frequency = egg_frequency
+        while game.running:
+            elapsed = clock.tick(0 if fast else RENDER_FPS)
+            if fast:
+                elapsed = game.sim.step_ms
+            stats.mark('wait')
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.time.set_timer(EGG, 0)
                     return False, None
-                if event.type == pygame.MOUSEBUTTONDOWN:
-                    if switch_sound.rect.collidepoint(pygame.mouse.get_pos()):
-                        switch_on = not switch_on
-                        switch_sound.change_switch(int(switch_on))
-                        pygame.mixer.music.set_volume(level_music if switch_on else 0)
-                        switch_sound_.play()
-
-                    if push_turn.push_collidepoint(pygame.mouse.get_pos()):
-                        if not show_help:
-                            if push_on[0]:
-                                pygame.time.set_timer(EGG, 0)
-                                return False, None
-                            push_on[0] = not push_on[0]
-                            push_turn.change_push(int(push_on[0]))
-                            push_sound.play()
-                        else:
-                            denied_sound.play()
-                    if push_enable.push_collidepoint(pygame.mouse.get_pos()):
-                        if push_on[0] and not show_help:
-                            pause_state = not pause_state
-                            push_enable.change_push(2 + int(pause_state))
-                            push_sound.play()
-                        else:
-                            denied_sound.play()
-                    if push_info.push_collidepoint(pygame.mouse.get_pos()):
-                        push_sound.play()
-                        show_help = not show_help
-                if pause_state:
+                if event.type == pygame.KEYDOWN and event.key == PERF_HUD_KEY:
+                    toggle_hud(game)
                     continue
-                if event.type == EGG and push_on[0]:
-                    Egg(points_egg[random.randint(0, 3)])
-                if event.type == CATCH:
-                    total += 1
-                if event.type == NO_CATCH:
-                    life -= 1
-                    if chickens:
-                        chickens.pop(0).kill()
-                    if life == 0:
-                        pygame.time.set_timer(EGG, 0)
-                        running = False
-                if event.type == pygame.KEYDOWN:
-                    if event.key in (1073741919, pygame.K_END):
-                        wolf.move(0, points_wolf, points_catch[0])
-                    elif event.key in (1073741921, pygame.K_HOME):
-                        wolf.move(1, points_wolf, points_catch[1])
-                    elif event.key in (1073741915, pygame.K_UP):
-                        wolf.move(3, points_wolf, points_catch[3])
-                    elif event.key in (1073741913, pygame.K_DOWN):
-                        wolf.move(2, points_wolf, points_catch[2])
-                    elif event.key == pygame.K_SPACE:
-                        space = not space
-                        pygame.time.set_timer(EGG, 0 if space else egg_frequency)
-
-            surface_bg.blit(level, (0, 0))
-            screen.blit(surface_bg, (160, 60))
-            counter = FONT.render(f'{total}', True, (255, 0, 0))
-            box = counter.get_rect(midtop=(width - width // 4, height // 8))
-            screen.blit(counter, box)
-            screen.blit(trays, (-1, 0))
-            all_sprites.draw(screen)
-            if not pause_state:
-                all_sprites.update(wolf.point)
-            else:
-                pause_text = FONT.render("ПАУЗА", True, (255, 0, 0))
-                screen.blit(pause_text, (width // 2 - pause_text.get_width() // 2, height // 2))
-            screen.blit(monitor, (0, 0))
-            if show_help:
-                if not pause_state and push_on[0]:
-                    pause_state = not pause_state
-                    push_enable.change_push(2 + int(pause_state))
-                help_surface = pygame.Surface((width, height), pygame.SRCALPHA)
-                help_surface.fill((0, 0, 0, 180))
-                screen.blit(help_surface, (0, 0))
-
-                # Создаем текст подсказки
-                font = pygame.font.Font(None, 36)
-                lines = [
-                    "Управление в игре:",
-                    "",
-                    "Клавиши END/HOME - движение волка влево/вправо",
-                    "Клавиши UP/DOWN - движение волка вверх/вниз",
-                    "Клавиша SPACE - пауза",
-                    "Кнопка звука - включение/выключение звука",
-                    "Кнопка паузы - поставить игру на паузу",
-                    "",
-                    "Нажмите кнопку информации еще раз, чтобы закрыть"
-                ]
-                for i, line in enumerate(lines):
-                    text = font.render(line, True, (255, 255, 255))
-                    screen.blit(text, (width // 2 - text.get_width() // 2,
-                                       height // 2 - 100 + i * 40))
-
-            control_sprites.draw(screen)
-
-            pygame.display.flip()
+                pos = view.to_surface(event.pos, screen) if event.type == pygame.MOUSEBUTTONDOWN else None
+                if not game.handle(event, pos):
+                    return False, None
+
+            stats.mark('events')
+            game.update(elapsed)
+            stats.mark('simulation')
+            game.sync(stats)
+            stats.mark('sync')
+            rects = game.render(dirty)
+            stats.mark('draw')
+            view.present(screen, rects)
+            stats.mark('present')
+            stats.end_frame()
     finally:
-        pygame.mixer.music.stop()
-        pygame.time.set_timer(EGG, 0)
-        update_user_stats(username, total)
-        return True, total
+        sound_bank.stop_music()
+        end_game(game, username, seed, rules)
+        return True, game.sim.total
+
+
+def run_boards(screen, usernames, dirty=DIRTY_RENDER, chaos=CHAOS_MODE):
+    """Несколько независимых игр в одном окне (автомат на несколько мест)
+
+    screen делится на поля размера игрового поля (view.render_scale: при 0.5 - четыре поля),
+    каждое место играет на своей подповерхности своими клавишами (SEAT_KEYS) и мышью.
+    Возвращает очки игр"""
+    board_width, board_height = scaled_point(size)
+    columns = screen.get_width() // board_width
+    seats = min(columns * (screen.get_height() // board_height), len(SEAT_KEYS))
+    if not 0 < len(usernames) <= seats:
+        raise ValueError(f'{len(usernames)} boards do not fit: {seats} seats at render scale {view.render_scale}')
+    games = []
+    for seat, username in enumerate(usernames):
+        board = screen.subsurface(pygame.Rect((seat % columns) * board_width, (seat // columns) * board_height,
+                                              board_width, board_height))
+        games.append(new_game(board, chaos, keys=SEAT_KEYS[seat]))
+    # время кадра общее для всего окна: панель производительности одна, на первом поле
+    hud_game = games[0][0]
+    if PERF_HUD:
+        toggle_hud(hud_game)
+    stats = FrameStats(export=PERF_EXPORT)
+    clock = pygame.time.Clock()
+
+    sound_bank.play_music('wolf_catches_eggs1.mp3', music_switch.volume())
+
+    try:
+        active = [game for game, seed, rules in games]
+        while active:
+            elapsed = clock.tick(RENDER_FPS)
+            stats.mark('wait')
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return [game.sim.total for game, seed, rules in games]
+                if event.type == pygame.KEYDOWN and event.key == PERF_HUD_KEY:
+                    toggle_hud(hud_game)
+                    continue
+                for game in active:
+                    if event.type == pygame.MOUSEBUTTONDOWN:
+                        # нажатие мыши относится к полю, на котором оно сделано
+                        pos = view.to_surface(event.pos, game.screen)
+                        if game.screen.get_rect().collidepoint(pos) and not game.handle(event, pos):
+                            game.running = False
+                    else:
+                        game.handle(event)
+            stats.mark('events')
+            for game in active:
+                game.update(elapsed)
+            stats.mark('simulation')
+            for game in active:
+                game.sync(stats if game is hud_game else None)
+            stats.mark('sync')
+            areas = []
+            for game in active:
+                areas.extend(view.areas(game.screen, game.render(dirty)))
+            stats.mark('draw')
+            # изменившиеся области всех полей выводятся одним обновлением
+            pygame.display.update(areas)
+            stats.mark('present')
+            stats.end_frame()
+            # закончившиеся игры остаются на экране последним кадром
+            active = [game for game in active if game.running]
+    finally:
+        sound_bank.stop_music()
+        for username, (game, seed, rules) in zip(usernames, games):
+            end_game(game, username, seed, rules)
+    return [game.sim.total for game, seed, rules in games]
 
 
 def _show_screen_template(screen, title_text, title_color=(255, 179, 173)):
     """Шаблон для показа экранов (заставка и прощание)"""
-    image = load_image('old_gadget.jpg')
-    k = 1.5
-    new_width = int(image.get_rect().width * k)
-    new_height = int(image.get_rect().height * k)
-    image = pygame.transform.scale(image, (new_width, new_height))
+    image = load_asset('old_gadget.JPG', 1.5)
 
-    text = FONT.render(title_text, True, title_color)
+    text = render_text(FONT, title_text, title_color)
     titul = text.get_rect(midtop=(width // 2, 100))
 
-    pygame.mixer.music.load(path.join(snd_dir, 'old_gadget_game.mp3'))
-    pygame.mixer.music.set_volume(0.4)
-    pygame.mixer.music.play(loops=-1)
+    sound_bank.play_music('old_gadget_game.mp3', 0.4)
 
-    clock = pygame.time.Clock()
     waiting = True
+    full = True  # экран неподвижен: рисуется один раз и после событий окна
 
     while waiting:
-        clock.tick(FPS)
-        for event in pygame.event.get():
+        for event in wait_events():
             if event.type == pygame.QUIT:
-                pygame.mixer.music.stop()
+                sound_bank.stop_music()
                 return False
+            if event.type in EXPOSE_EVENTS:
+                full = True
             if event.type == pygame.KEYDOWN or event.type == pygame.MOUSEBUTTONDOWN:
                 waiting = False
+        if not full:
+            continue
 
         screen.fill((0, 0, 0))
         screen.blit(text, titul)
         screen.blit(image, (width // 6, height // 4))
 
-        font = pygame.font.Font(None, 36)
-        hint = font.render("Нажмите любую клавишу или кнопку мыши", True, (200, 200, 200))
+        font = get_font(36)
+        hint = render_text(font, "Нажмите любую клавишу или кнопку мыши", (200, 200, 200))
         screen.blit(hint, (width // 2 - hint.get_width() // 2, height - 100))
 
-        pygame.display.flip()
+        view.present(screen)
+        full = False
 
-    pygame.mixer.music.stop()
+    sound_bank.stop_music()
     return True
 
 
@@ -565,10 +716,15 @@ def main():
     pygame.init()
     pygame.display.set_caption("Ну Погоди!")
     pygame.mixer.init()
-    screen = pygame.display.set_mode(size)
+    # экраны меню рисуются в логическом размере, игровое поле - в своем масштабе
+    screen = view.open()
 
     # Показываем заставку
+    results_writer.start()
+    _loader.submit(sound_bank.preload)
+    preload_level_backgrounds()
     if not show_splash_screen(screen):
+        results_writer.close()
         pygame.quit()
         return
 
@@ -580,7 +736,7 @@ def main():
             current_user = show_user_selection_screen(screen)
             if not current_user:  # Если пользователь не выбран (нажали отмену)
                 break
-        play_again, total = run_game(screen, current_user)
+        play_again, total = run_game(view.board(), current_user)
 
         # Показываем результаты
         action = show_results_screen(screen, current_user, total)
@@ -594,10 +750,72 @@ def main():
 
     # Показываем прощальный экран
     show_goodbye_screen(screen)
+    # дожидаемся записи результатов, оставшихся в очереди
+    results_writer.close()
+    db.close()
+    sound_bank.clear()
     pygame.mixer.quit()
     pygame.quit()
 
 
+def main_boards(usernames):
+    """Автомат на несколько мест: игры игроков usernames идут одновременно в одном окне"""
+    pygame.init()
+    pygame.display.set_caption("Ну Погоди!")
+    pygame.mixer.init()
+    screen = view.open()
+    results_writer.start()
+    for username in usernames:
+        db.register_user(username)
+    preload_level_backgrounds()
+    totals = run_boards(screen, usernames)
+    for username, total in zip(usernames, totals):
+        print(f'{username}: {total}')
+    results_writer.close()
+    db.close()
+    sound_bank.clear()
+    pygame.mixer.quit()
+    pygame.quit()
+
+
+def main_transfer(import_file=None, export_file=None):
+    """Загрузка файла в базу и/или выгрузка базы в файл (без окна игры)"""
+    for file_name, transfer, action in ((import_file, import_data, 'imported from'),
+                                        (export_file, export_data, 'exported to')):
+        if file_name:
+            start = time.perf_counter()
+            counts = transfer(db, file_name)
+            print(f"{counts['users']} users, {counts['game_sessions']} game sessions {action} {file_name} "
+                  f"in {time.perf_counter() - start:.1f} s")
+    db.close()
+
+
 if __name__ == "__main__":
-    init_db()
-    main()
+    parser = argparse.ArgumentParser(description='Ну, погоди!')
+    parser.add_argument('--profile', default=PROFILE, metavar='FILE',
+                        help='профилировать игру и записать collapsed stacks для flamegraph в FILE')
+    parser.add_argument('--record', action='store_true', default=RECORD_GAMES,
+                        help='записывать игры для воспроизведения в replay.py')
+    parser.add_argument('--scale', type=float, default=view.output_scale,
+                        help='размер окна относительно 1400x800')
+    parser.add_argument('--render-scale', type=float, default=view.render_scale,
+                        help='масштаб отрисовки игрового поля (0.5 - половинное разрешение)')
+    parser.add_argument('--seats', nargs='+', metavar='NAME',
+                        help='игроки автомата на несколько мест (например, четыре при --render-scale 0.5)')
+    parser.add_argument('--export', metavar='FILE',
+                        help='выгрузить игроков и результаты игр в FILE (.jsonl или .csv) и выйти')
+    parser.add_argument('--import', dest='import_file', metavar='FILE',
+                        help='загрузить игроков и результаты игр из FILE (.jsonl или .csv) и выйти; '
+                             'у игроков, которые уже есть в базе, остается больший рекорд, '
+                             'уже сохраненные игры не повторяются')
+    args = parser.parse_args()
+    view.output_scale, view.render_scale = args.scale, args.render_scale
+    RECORD_GAMES = args.record
+    with profiling(args.profile, PROFILE_INTERVAL):
+        init_db()
+        if args.export or args.import_file:
+            main_transfer(args.import_file, args.export)
+        elif args.seats:
+            main_boards(args.seats)
+        else:
+            main()
@@ -1,4 +1,6 @@
 import pygame
+from functools import lru_cache
+from math import gcd
 from os import path
 
 # папки, хранящие файлы
@@ -7,6 +9,8 @@ img_dir = path.join(path.dirname(__file__), 'data')  # изображений
 
 # основное окно программы
 size = width, height = 1400, 800
+# общий реестр шрифтов: (имя файла, размер) -> шрифт
+_fonts = dict()
 
 
 def load_image(name, color_key=None):
@@ -24,3 +28,30 @@ def load_image(name, color_key=None):
     else:
         image = image.convert_alpha()
     return image
+
+
+def rotation_atlas(image, step):
+    '''Вспомогательная функция: заранее повёрнутые копии изображения
+    для всех углов, достижимых поворотами с шагом step градусов'''
+    atlas = dict()
+    for angle in range(0, 360, gcd(step, 360)):
+        rotated = pygame.transform.rotate(image, angle)
+        # прямоугольник с центром в (0, 0): сдвигается на центр спрайта
+        rect = rotated.get_rect(center=(0, 0))
+        atlas[angle] = (rotated, pygame.mask.from_surface(rotated), rect)
+    return atlas
+
+
+def get_font(font_size, name=None):
+    '''Шрифт из общего реестра (создается один раз)'''
+    key = (name, font_size)
+    if key not in _fonts:
+        _fonts[key] = pygame.font.Font(name, font_size)
+    return _fonts[key]
+
+
+@lru_cache(maxsize=512)
+def render_text(font, text, color, antialias=True):
+    '''Отрисованная строка из общего кэша: растеризуются только новые строки.
+    Возвращаемую поверхность нельзя изменять - она общая'''
+    return font.render(text, antialias, color)
@@ -0,0 +1,133 @@
+"""Время кадра по фазам, панель производительности и выгрузка гистограмм.
+
+Кадр игры делится на фазы: ожидание (clock.tick), обработка событий, шаги
+симуляции, перенос состояния симуляции на спрайты, отрисовка и вывод на
+экран. Последние кадры хранятся в скользящем окне для панели, гистограммы
+по фазам периодически выгружаются строкой JSON в файл или UDP-сокет
+(адрес вида udp://host:port) и начинаются заново."""
+import json
+import socket
+import time
+from collections import deque
+
+import pygame
+
+from my_tools import get_font
+
+PHASES = ('wait', 'events', 'simulation', 'sync', 'draw', 'present')
+# верхние границы корзин гистограмм (мс); последняя корзина - все, что дольше
+BUCKETS = (0.5, 1, 2, 4, 8, 16.7, 33.3, 50, 100, 250)
+
+
+def bucket(ms):
+    for index, bound in enumerate(BUCKETS):
+        if ms <= bound:
+            return index
+    return len(BUCKETS)
+
+
+class Exporter:
+    """Получатель гистограмм: файл (строка JSON на выгрузку) или UDP-сокет"""
+
+    def __init__(self, target):
+        self.target = target
+        self.address = None
+        if target.startswith('udp://'):
+            host, port = target[len('udp://'):].rsplit(':', 1)
+            self.address = (host, int(port))
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, record):
+        line = json.dumps(record)
+        try:
+            if self.address is not None:
+                self.socket.sendto(line.encode(), self.address)
+            else:
+                with open(self.target, 'a') as file:
+                    file.write(line + '\n')
+        except OSError as message:
+            print('Cannot export frame stats:', message)
+
+
+class FrameStats:
+    """Длительность фаз каждого кадра: mark(фаза) закрывает фазу, end_frame() - кадр"""
+
+    def __init__(self, window=300, export=None, period=5.0):
+        self.frames = deque(maxlen=window)  # длительности фаз последних кадров (мс)
+        self.phase = dict.fromkeys(PHASES, 0.0)
+        self.histograms = {phase: [0] * (len(BUCKETS) + 1) for phase in PHASES + ('frame',)}
+        self.exporter = Exporter(export) if export else None
+        self.period = period
+        self.exported = self.last = time.perf_counter()
+        self.info = dict()  # состояние игры для панели и выгрузки
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phase[phase] += (now - self.last) * 1000
+        self.last = now
+
+    def end_frame(self):
+        durations = tuple(self.phase[phase] for phase in PHASES)
+        self.frames.append(durations)
+        for phase, ms in zip(PHASES, durations):
+            self.histograms[phase][bucket(ms)] += 1
+        self.histograms['frame'][bucket(sum(durations))] += 1
+        self.phase = dict.fromkeys(PHASES, 0.0)
+        if self.exporter is not None and self.last - self.exported >= self.period:
+            self.export()
+
+    def summary(self):
+        """Среднее и 95-й перцентиль каждой фазы и всего кадра по окну (мс)"""
+        if not self.frames:
+            return dict()
+        columns = dict(zip(PHASES, zip(*self.frames)))
+        columns['frame'] = [sum(frame) for frame in self.frames]
+        result = dict()
+        for phase, values in columns.items():
+            values = sorted(values)
+            result[phase] = (sum(values) / len(values), values[int(0.95 * (len(values) - 1))])
+        return result
+
+    def export(self):
+        self.exporter.send({'time': time.time(), 'buckets_ms': BUCKETS, 'histograms': self.histograms,
+                            'summary': self.summary(), 'info': self.info})
+        self.histograms = {phase: [0] * (len(BUCKETS) + 1) for phase in self.histograms}
+        self.exported = self.last
+
+
+class PerfHud:
+    """Панель с временем фаз кадра и состоянием игры (обновляется несколько раз в секунду)"""
+
+    def __init__(self, position=(170, 70), period=0.25):
+        self.font = get_font(22)
+        self.position = position
+        self.period = period
+        self.updated = 0
+        self.surface = None
+        self.rect = pygame.Rect(position, (0, 0))
+
+    def update(self, stats):
+        """Перерисовывает панель, если подошло время; возвращает изменившуюся область или None"""
+        now = time.perf_counter()
+        if self.surface is not None and now - self.updated < self.period:
+            return None
+        self.updated = now
+        summary = stats.summary()
+        frame = summary.get('frame', (0, 0))[0]
+        lines = [f'FPS {1000 / frame:.0f}' if frame else 'FPS -', 'фаза      сред.   p95 мс']
+        lines += [f'{phase:9} {mean:6.2f} {p95:6.2f}' for phase, (mean, p95) in summary.items()]
+        lines += [f'{name}: {value}' for name, value in stats.info.items()]
+        # строки с меняющимися числами не кэшируются
+        texts = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+        surface = pygame.Surface((max(text.get_width() for text in texts) + 16, 22 * len(texts) + 12),
+                                 pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 170))
+        for i, text in enumerate(texts):
+            surface.blit(text, (8, 6 + 22 * i))
+        old_rect = self.rect
+        self.surface, self.rect = surface, surface.get_rect(topleft=self.position)
+        return old_rect.union(self.rect)
+
+    def draw(self, target):
+        if self.surface is not None:
+            target.blit(self.surface, self.rect)
@@ -0,0 +1,69 @@
+"""Фоновая запись результатов игр (write-behind).
+
+Результаты ставятся в очередь из игрового потока и записываются рабочим
+потоком пачками, каждая пачка - одна транзакция."""
+import queue
+import threading
+from datetime import datetime
+
+_STOP = object()  # сигнал рабочему потоку: записать оставшееся и завершиться
+
+
+class ResultWriter:
+    """Очередь результатов и рабочий поток, сохраняющий их функцией save_batch.
+
+    save_batch(sessions) получает список (имя, очки, дата игры)"""
+
+    def __init__(self, save_batch, batch_size=64):
+        self.save_batch = save_batch
+        self.batch_size = batch_size
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='result-writer', daemon=True)
+            self.thread.start()
+
+    def put(self, username, score):
+        """Ставит результат в очередь, не дожидаясь записи"""
+        self.start()
+        self.queue.put((username, score, datetime.now().isoformat()))
+
+    def run(self):
+        running = True
+        while running:
+            batch = [self.queue.get()]
+            # забираем все, что уже накопилось в очереди
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if _STOP in batch:
+                running = False
+                batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self.save(batch)
+
+    def save(self, batch):
+        """Запись пачки; если она откатилась, результаты записываются по одному,
+        чтобы из-за одного ошибочного результата не потерять остальные"""
+        if len(batch) > 1:
+            try:
+                self.save_batch(batch)
+                return
+            except Exception:
+                pass
+        for session in batch:
+            try:
+                self.save_batch([session])
+            except Exception as message:
+                print(f'Cannot save result {session}: {message}')
+
+    def close(self):
+        """Дожидается записи всех результатов из очереди и останавливает поток"""
+        if self.thread is not None:
+            self.queue.put(_STOP)
+            self.thread.join()
+            self.thread = None
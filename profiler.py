@@ -0,0 +1,136 @@
+"""Выборочный профилировщик главного потока.
+
+Фоновый поток через равные промежутки времени снимает стек главного потока
+(sys._current_frames) и считает одинаковые стеки. Результат - файл в
+формате collapsed stacks ("модуль.функция;...;модуль.функция число") для
+flamegraph.pl, speedscope и подобных, и доли времени подсистем игры.
+Снимок стека занимает десятки микросекунд, при частоте 100 Гц это доли
+процента времени кадра.
+
+Включается переменной окружения PROFILE=файл или ключом --profile файл."""
+import linecache
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from os import path
+
+# подсистемы: (модуль, функция) или (модуль, None) - все функции модуля;
+# время относится к подсистеме ближайшего к вершине стека подходящего вызова
+SUBSYSTEMS = (
+    ('eggs', {('engine', 'advance'), ('engine', 'rotate'), ('engine', 'move'), ('engine', 'collidepoint'),
+              ('engine', 'spawn'), ('egg_array', None), ('classes', 'sync_eggs'), ('classes', 'show')}),
+    ('sprite_draw', {('sprite', 'draw'), ('classes', 'render'), ('classes', 'dirty_rects'),
+                     ('classes', 'merge_rects')}),
+    ('fonts', {('my_tools', 'render_text'), ('my_tools', 'get_font'), ('perf', 'update')}),
+    ('image_io', {('my_tools', 'load_image'), ('assets', None)}),
+    ('database', {('database', None), ('persistence', None), ('transfer', None), ('main_game', 'init_db')}),
+    ('sound', {('sounds', None)}),
+    ('simulation', {('engine', None)}),
+)
+# вызовы функций на C из игрового цикла видны только как строка кода: подстрока -> подсистема
+LINE_SUBSYSTEMS = (('tick(', 'wait'), ('flip(', 'present'), ('update(', 'present'),
+                   ('.draw(', 'sprite_draw'), ('blit(', 'draw'), ('render(', 'fonts'))
+
+
+def frame_label(code):
+    return f'{path.splitext(path.basename(code.co_filename))[0]}.{code.co_name}'
+
+
+def subsystem(codes, lineno):
+    """Подсистема стека (коды функций от корня к вершине, строка вершины)"""
+    for code in reversed(codes):
+        module = path.splitext(path.basename(code.co_filename))[0]
+        for name, functions in SUBSYSTEMS:
+            if (module, code.co_name) in functions or (module, None) in functions:
+                return name
+    if codes:
+        line = linecache.getline(codes[-1].co_filename, lineno)
+        for text, name in LINE_SUBSYSTEMS:
+            if text in line:
+                return name
+    return 'other'
+
+
+class SamplingProfiler:
+    """Снимки стека потока thread_id каждые interval секунд"""
+
+    def __init__(self, output, interval=0.01, thread_id=None, flush_period=10.0):
+        self.output = output
+        self.interval = interval
+        self.thread_id = thread_id if thread_id is not None else threading.main_thread().ident
+        self.flush_period = flush_period
+        self.stacks = Counter()  # (коды функций от корня к вершине, строка вершины) -> число снимков
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.thread is not None:
+            self.stopping.set()
+            self.thread.join()
+            self.thread = None
+        self.write()
+
+    def run(self):
+        flushed = time.monotonic()
+        while not self.stopping.wait(self.interval):
+            self.sample()
+            # файл обновляется и во время работы: профиль не пропадет, если процесс завершат
+            if time.monotonic() - flushed >= self.flush_period:
+                self.write()
+                flushed = time.monotonic()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        lineno = frame.f_lineno
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        codes.reverse()
+        self.stacks[tuple(codes), lineno] += 1
+
+    def collapsed(self):
+        """Строки collapsed stacks, первым кадром идет подсистема"""
+        lines = Counter()
+        for (codes, lineno), count in list(self.stacks.items()):
+            labels = [subsystem(codes, lineno)] + [frame_label(code) for code in codes]
+            lines[';'.join(labels)] += count
+        return [f'{stack} {count}' for stack, count in sorted(lines.items())]
+
+    def summary(self):
+        """Доля снимков каждой подсистемы"""
+        counts = Counter()
+        for (codes, lineno), count in list(self.stacks.items()):
+            counts[subsystem(codes, lineno)] += count
+        total = sum(counts.values())
+        return {name: count / total for name, count in counts.most_common()} if total else dict()
+
+    def write(self):
+        with open(self.output, 'w') as file:
+            file.write('\n'.join(self.collapsed()) + '\n')
+
+
+@contextmanager
+def profiling(output, interval=0.01):
+    """Профилирование главного потока на время блока with (без output - ничего не делает)"""
+    if not output:
+        yield None
+        return
+    profiler = SamplingProfiler(output, interval)
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        samples = sum(profiler.stacks.values())
+        print(f'Profile: {samples} samples written to {output}')
+        for name, share in profiler.summary().items():
+            print(f'{name:12} {share:6.1%}')
@@ -0,0 +1,133 @@
+"""Запись и воспроизведение игр.
+
+Игра полностью задается seed симуляции, правилами и командами игрока,
+привязанными к номеру шага симуляции. Запись - компактный двоичный файл:
+заголовок и по 9 байт на команду. Воспроизведение без окна выполняет те же
+шаги быстрее реального времени, с окном - показывает игру.
+
+Пример: python replay.py replays/20261018_190000_1f2e.nplog --show --fast"""
+import argparse
+import os
+import struct
+import time
+from os import path
+
+from engine import Simulation
+
+# записи хранятся рядом с игрой (а не в текущем каталоге); старые удаляются сверх MAX_RECORDS
+RECORD_DIR = path.join(path.dirname(__file__), 'replays')
+MAX_RECORDS = 200
+MAGIC = b'NPRL'
+VERSION = 3
+# с версии 3 яйца пачки появляются сразу, сдвинутыми по лотку: старые записи с пачками
+# не воспроизводятся
+BURST_VERSION = 3
+# сигнатура, версия, seed, NumPy-режим, яиц за появление
+HEADER = struct.Struct('<4sHQ?H')
+# номер шага, команда, аргумент
+RECORD = struct.Struct('<IBi')
+END = 255  # последняя запись: число шагов игры и набранные очки
+
+
+def save_log(file_name, seed, rules, inputs, steps, total):
+    with open(file_name, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, seed, rules.get('vectorized', False),
+                               rules.get('eggs_per_spawn', 1)))
+        file.write(b''.join(RECORD.pack(*record) for record in inputs))
+        file.write(RECORD.pack(steps, END, total))
+
+
+def load_log(file_name):
+    """Запись игры: словарь seed, rules, inputs, steps, total"""
+    with open(file_name, 'rb') as file:
+        data = file.read()
+    magic, version, seed, vectorized, eggs_per_spawn = HEADER.unpack_from(data)
+    if magic != MAGIC or version > VERSION or (eggs_per_spawn > 1 and version < BURST_VERSION):
+        raise ValueError(f'{file_name}: not a game record')
+    inputs = list(RECORD.iter_unpack(data[HEADER.size:]))
+    steps, _, total = inputs.pop()
+    return {'seed': seed, 'rules': {'vectorized': vectorized, 'eggs_per_spawn': eggs_per_spawn},
+            'inputs': inputs, 'steps': steps, 'total': total}
+
+
+def record_game(sim, seed, rules):
+    """Сохраняет игру в RECORD_DIR; возвращает имя файла"""
+    os.makedirs(RECORD_DIR, exist_ok=True)
+    file_name = path.join(RECORD_DIR, f'{time.strftime("%Y%m%d_%H%M%S")}_{seed:x}.nplog')
+    save_log(file_name, seed, rules, sim.log, sim.steps, sim.total)
+    prune_records()
+    return file_name
+
+
+def prune_records(keep=None):
+    """Удаляет самые старые записи, оставляя keep (по умолчанию MAX_RECORDS) последних;
+    имена записей начинаются с даты и времени"""
+    keep = MAX_RECORDS if keep is None else keep
+    records = sorted(name for name in os.listdir(RECORD_DIR) if name.endswith('.nplog'))
+    for name in records[:max(0, len(records) - keep)]:
+        try:
+            os.remove(path.join(RECORD_DIR, name))
+        except OSError:
+            pass
+
+
+class Replayer:
+    """Подает симуляции записанные команды перед шагом, к которому они относятся"""
+
+    def __init__(self, log, start_step=0):
+        self.log = log
+        self.position = 0
+        # команды до start_step уже выполнены (симуляция прокручена без записи)
+        while self.position < len(log['inputs']) and log['inputs'][self.position][0] < start_step:
+            self.position += 1
+
+    def apply(self, sim):
+        inputs = self.log['inputs']
+        while self.position < len(inputs) and inputs[self.position][0] <= sim.steps:
+            sim.command(*inputs[self.position][1:])
+            self.position += 1
+
+    def finished(self, sim):
+        return sim.over or sim.steps >= self.log['steps']
+
+
+def replay_headless(log):
+    """Воспроизведение без отрисовки; возвращает симуляцию после последнего шага"""
+    sim = Simulation(log['seed'], **log['rules'])
+    player = Replayer(log)
+    while not player.finished(sim):
+        player.apply(sim)
+        sim.step()
+    player.apply(sim)
+    return sim
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение записанной игры')
+    parser.add_argument('log', help='файл записи игры')
+    parser.add_argument('--show', action='store_true', help='показать игру в окне')
+    parser.add_argument('--fast', action='store_true', help='в окне: шаг симуляции на каждый кадр без ожидания')
+    args = parser.parse_args()
+
+    log = load_log(args.log)
+    if not args.show:
+        start = time.perf_counter()
+        sim = replay_headless(log)
+        seconds = time.perf_counter() - start
+        print(f'steps: {sim.steps}, total: {sim.total}, level: {sim.level}, '
+              f'{"match" if (sim.steps, sim.total) == (log["steps"], log["total"]) else "MISMATCH"}, '
+              f'{seconds:.3f} s ({sim.time / 1000 / max(seconds, 1e-9):.0f}x real time)')
+        return
+
+    import pygame
+    import main_game
+    pygame.init()
+    pygame.mixer.init()
+    screen = pygame.display.set_mode(main_game.size)
+    _, total = main_game.run_game(screen, None, replay=log, fast=args.fast)
+    print(f'total: {total}, recorded: {log["total"]}')
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    main()
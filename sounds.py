@@ -0,0 +1,120 @@
+"""Звуки игры, декодированные один раз.
+
+Банк хранит звуки в памяти для всех экранов и перезапусков игры, а
+декодированные данные (PCM в формате микшера) - на диске между запусками:
+MP3 декодируется только при первом запуске или после изменения файла.
+Музыка играет как зацикленный звук на отдельном зарезервированном канале."""
+import os
+import threading
+from os import path
+
+import pygame
+
+from my_tools import snd_dir
+
+CACHE_DIR = path.join(snd_dir, 'cache')
+# звуки экранов игры (загружаются заранее в фоновом потоке)
+SOUNDS = ('old_gadget_game.mp3', 'wolf_catches_eggs1.mp3', 'switch.wav', 'push.wav', 'denied.mp3')
+MUSIC_CHANNEL = 0  # канал, зарезервированный для музыки
+
+
+class SoundBank:
+    """Звуки по имени файла: из памяти, из дискового кэша PCM или из файла"""
+
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.sounds = dict()
+        self.lock = threading.RLock()
+        self.music = None  # канал музыки (после инициализации микшера)
+
+    def cache_path(self, name):
+        '''Файл кэша: зависит от формата микшера и от размера и времени изменения исходного файла;
+        None, если микшер не инициализирован (формат неизвестен)'''
+        mixer_format = pygame.mixer.get_init()
+        if mixer_format is None:
+            return None
+        frequency, size_, channels = mixer_format
+        stat = os.stat(path.join(snd_dir, name))
+        return path.join(self.cache_dir,
+                         f'{name}.{frequency}_{size_}_{channels}.{stat.st_size}_{int(stat.st_mtime)}.pcm')
+
+    def get(self, name):
+        with self.lock:
+            if name not in self.sounds:
+                self.sounds[name] = self.load(name)
+            return self.sounds[name]
+
+    def load(self, name):
+        try:
+            cache = self.cache_path(name)
+        except OSError as message:
+            print('Cannot load sound:', name)
+            raise SystemExit(message)
+        if cache is None:
+            return pygame.mixer.Sound(path.join(snd_dir, name))
+        if path.exists(cache):
+            with open(cache, 'rb') as file:
+                return pygame.mixer.Sound(buffer=file.read())
+        sound = pygame.mixer.Sound(path.join(snd_dir, name))
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self.prune(name)
+            # запись во временный файл: недописанный кэш не будет прочитан при следующем запуске
+            with open(cache + '.tmp', 'wb') as file:
+                file.write(sound.get_raw())
+            os.replace(cache + '.tmp', cache)
+        except OSError as message:
+            print('Cannot cache sound:', name, message)
+        return sound
+
+    def prune(self, name):
+        '''Удаляет кэш звука name для прежних версий файла и форматов микшера'''
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.startswith(name + '.') and file_name.endswith('.pcm'):
+                os.remove(path.join(self.cache_dir, file_name))
+
+    @staticmethod
+    def enabled():
+        '''Микшер инициализирован (без него, например без звуковой карты, игра идет без звука)'''
+        return pygame.mixer.get_init() is not None
+
+    def preload(self, names=SOUNDS):
+        if self.enabled():
+            for name in names:
+                self.get(name)
+
+    def play(self, name):
+        if self.enabled():
+            self.get(name).play()
+
+    def music_channel(self):
+        if self.music is None:
+            pygame.mixer.set_reserved(MUSIC_CHANNEL + 1)
+            self.music = pygame.mixer.Channel(MUSIC_CHANNEL)
+        return self.music
+
+    def play_music(self, name, volume=1.0):
+        '''Зацикленная музыка на зарезервированном канале'''
+        if not self.enabled():
+            return
+        channel = self.music_channel()
+        channel.play(self.get(name), loops=-1)
+        channel.set_volume(volume)
+
+    def set_music_volume(self, volume):
+        if self.enabled():
+            self.music_channel().set_volume(volume)
+
+    def stop_music(self):
+        if self.music is not None and self.enabled():
+            self.music.stop()
+
+    def clear(self):
+        '''Забывает звуки (нужно после повторной инициализации микшера)'''
+        with self.lock:
+            self.sounds.clear()
+            self.music = None
+
+
+# общий банк звуков всех экранов игры
+sound_bank = SoundBank()
@@ -0,0 +1,108 @@
+"""Перенос игроков и результатов игр между автоматами через файл JSONL или CSV.
+
+Файл - поток записей: сначала игроки (поле table = users), затем игры
+(table = game_sessions). Игра ссылается на игрока по имени. Файл пишется
+и читается построчно, в памяти держится не больше одной пачки строк, так
+что размер таблиц ограничен только диском.
+
+Пример: python main_game.py --export kiosk.jsonl
+        python main_game.py --import kiosk.jsonl"""
+import csv
+import json
+from itertools import groupby, islice
+from json.encoder import encode_basestring
+from operator import itemgetter
+from os import path
+
+from database import EXPORT_SESSIONS, EXPORT_USERS
+
+# поля записей каждой таблицы (в CSV - общий заголовок, лишние поля пустые)
+FIELDS = {
+    'users': ('username', 'registration_date', 'last_played', 'highscore'),
+    'game_sessions': ('username', 'play_date', 'score'),
+}
+CSV_HEADER = ('table', 'username', 'registration_date', 'last_played', 'highscore', 'play_date', 'score')
+# числовые поля (в CSV все поля - строки; пустое поле - 0)
+NUMBERS = ('highscore', 'score')
+# строк в одном executemany
+BATCH_SIZE = 10000
+
+
+def file_format(file_name):
+    """Формат по расширению файла: 'csv' или 'jsonl'"""
+    return 'csv' if path.splitext(file_name)[1].lower() == '.csv' else 'jsonl'
+
+
+def json_value(value):
+    """Значение поля в JSON (строки кодируются без json.dumps: он в несколько раз медленнее)"""
+    if value is None:
+        return 'null'
+    return encode_basestring(value) if isinstance(value, str) else str(value)
+
+
+def write_table(file, file_type, table, rows):
+    """Запись строк таблицы (кортежей полей FIELDS[table]); возвращает их число"""
+    count = 0
+    if file_type == 'csv':
+        # места полей таблицы в общем заголовке
+        columns = [CSV_HEADER.index(field) for field in FIELDS[table]]
+        line = [table] + [None] * (len(CSV_HEADER) - 1)
+        writer = csv.writer(file)
+        for row in rows:
+            for column, value in zip(columns, row):
+                line[column] = value
+            writer.writerow(line)
+            count += 1
+    else:
+        template = '{' + ', '.join([f'"table": "{table}"'] + [f'"{field}": %s' for field in FIELDS[table]]) + '}\n'
+        for row in rows:
+            file.write(template % tuple(map(json_value, row)))
+            count += 1
+    return count
+
+
+def export_data(db, file_name):
+    """Выгрузка всех игроков, затем всех игр; возвращает число строк каждой таблицы"""
+    file_type = file_format(file_name)
+    counts = dict()
+    with open(file_name, 'w', encoding='utf-8', newline='') as file:
+        if file_type == 'csv':
+            csv.writer(file).writerow(CSV_HEADER)
+        for table, query in (('users', EXPORT_USERS), ('game_sessions', EXPORT_SESSIONS)):
+            counts[table] = write_table(file, file_type, table, db.export_rows(query))
+    return counts
+
+
+def read_rows(file_name):
+    """Строки (таблица, кортеж полей FIELDS[таблица]) из файла по одной"""
+    with open(file_name, encoding='utf-8', newline='') as file:
+        if file_format(file_name) == 'csv':
+            reader = csv.reader(file)
+            header = next(reader)
+            # места полей каждой таблицы в заголовке файла
+            columns = {table: [header.index(field) for field in fields] for table, fields in FIELDS.items()}
+            numbers = {table: [field in NUMBERS for field in fields] for table, fields in FIELDS.items()}
+            for line in reader:
+                table = line[0]
+                # пустое поле CSV - отсутствующее значение
+                yield table, tuple((int(line[column] or 0) if number else line[column] or None)
+                                   for column, number in zip(columns[table], numbers[table]))
+        else:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    table = record['table']
+                    yield table, tuple((record.get(field) or 0) if field in NUMBERS else record.get(field)
+                                       for field in FIELDS[table])
+
+
+def row_batches(rows, batch_size=BATCH_SIZE):
+    """Пачки (таблица, строки) не длиннее batch_size из подряд идущих строк одной таблицы"""
+    for table, group in groupby(rows, key=itemgetter(0)):
+        group = map(itemgetter(1), group)
+        while batch := list(islice(group, batch_size)):
+            yield table, batch
+
+
+def import_data(db, file_name):
+    return db.import_batches(row_batches(read_rows(file_name)))
@@ -0,0 +1,121 @@
+"""Окно игры и поверхности, в которые рисуются экраны.
+
+Расположение всех элементов задается в одном логическом пространстве
+размера my_tools.size. Окно может быть больше или меньше логического
+размера (OUTPUT_SCALE), а игровое поле рисуется в поверхность своего
+масштаба (RENDER_SCALE): на слабых устройствах - в половинном разрешении.
+Нарисованный кадр один раз выводится в окно с масштабированием; симуляция
+от масштабов не зависит."""
+import os
+from math import ceil, floor
+
+import pygame
+
+from my_tools import size
+
+# размер окна относительно логического (переменная окружения OUTPUT_SCALE или ключ --scale)
+OUTPUT_SCALE = float(os.environ.get('OUTPUT_SCALE', 1))
+# масштаб поверхности игрового поля (переменная окружения RENDER_SCALE или ключ --render-scale)
+RENDER_SCALE = float(os.environ.get('RENDER_SCALE', 1))
+
+
+def scaled(value, scale=None):
+    """Логическая длина в пикселях поверхности масштаба scale (по умолчанию - игрового поля)"""
+    scale = view.render_scale if scale is None else scale
+    return value if scale == 1 else round(value * scale)
+
+
+def scaled_point(point, scale=None):
+    return tuple(scaled(value, scale) for value in point)
+
+
+def map_rect(rect, source, target):
+    """Прямоугольник поверхности source в координатах поверхности target (с захватом краев)"""
+    kx, ky = target.get_width() / source.get_width(), target.get_height() / source.get_height()
+    left, top = floor(rect.left * kx), floor(rect.top * ky)
+    return pygame.Rect(left, top, ceil(rect.right * kx) - left, ceil(rect.bottom * ky) - top)
+
+
+class View:
+    """Окно и поверхности масштабов: логическая (меню) и игрового поля"""
+
+    def __init__(self, output_scale=OUTPUT_SCALE, render_scale=RENDER_SCALE):
+        self.output_scale = output_scale
+        # изображения поля загружаются в этом масштабе, поэтому он задается до начала первой игры
+        self.render_scale = render_scale
+        self.canvases = dict()  # масштаб -> поверхность (если размер не совпадает с окном)
+
+    @staticmethod
+    def window():
+        return pygame.display.get_surface()
+
+    def open(self, flags=0):
+        """Создает окно; возвращает логическую поверхность для экранов меню"""
+        pygame.display.set_mode(scaled_point(size, self.output_scale), flags)
+        self.canvases.clear()
+        return self.canvas(1)
+
+    def board(self):
+        """Поверхность игрового поля"""
+        return self.canvas(self.render_scale)
+
+    def canvas(self, scale=1):
+        """Поверхность логического размера в масштабе scale; при размере окна - само окно"""
+        window = self.window()
+        canvas_size = scaled_point(size, scale)
+        if window.get_size() == canvas_size:
+            return window
+        if scale not in self.canvases:
+            self.canvases[scale] = pygame.Surface(canvas_size).convert()
+        return self.canvases[scale]
+
+    def areas(self, surface, rects=None):
+        """Переносит в окно поверхность целиком или ее области rects (масштабируя до окна);
+        возвращает изменившиеся области окна (None - все окно)"""
+        window = self.window()
+        parent = surface.get_abs_parent()
+        if parent is not surface:
+            # подповерхность (поле одной из нескольких игр): области в координатах родителя
+            offset = surface.get_abs_offset()
+            rects = [surface.get_rect(topleft=offset)] if rects is None else [rect.move(offset) for rect in rects]
+            surface = parent
+        if surface is window:
+            return rects
+        if rects is None:
+            pygame.transform.scale(surface, window.get_size(), window)
+            return None
+        # масштабируются только изменившиеся области: область окна и соответствующая ей
+        # область кадра (при целых отношениях масштабов точно совпадает с полным кадром)
+        areas = []
+        for rect in rects:
+            area = map_rect(rect, surface, window).clip(window.get_rect())
+            source = map_rect(area, window, surface).clip(surface.get_rect())
+            if area and source:
+                pygame.transform.scale(surface.subsurface(source), area.size, window.subsurface(area))
+                areas.append(area)
+        return areas
+
+    def present(self, surface, rects=None):
+        """Выводит на экран поверхность целиком или ее области rects"""
+        areas = self.areas(surface, rects)
+        if areas is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(areas)
+
+    def to_surface(self, pos, surface):
+        """Точка окна (события мыши) в координатах поверхности surface (в том числе подповерхности)"""
+        window = self.window()
+        parent = surface.get_abs_parent()
+        if parent is not window:
+            pos = (pos[0] * parent.get_width() // window.get_width(),
+                   pos[1] * parent.get_height() // window.get_height())
+        x, y = surface.get_abs_offset()
+        return pos[0] - x, pos[1] - y
+
+    def mouse_pos(self, surface):
+        return self.to_surface(pygame.mouse.get_pos(), surface)
+
+
+# общее окно всех экранов игры
+view = View()